@@ -34,6 +34,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 PROJECT_APPS = [
@@ -162,6 +163,20 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+GRAPHENE = {
+    # Populates the `_debug` query field with the SQL each GraphQL request ran.
+    "MIDDLEWARE": ["graphene_django.debug.DjangoDebugMiddleware"] if DEBUG else [],
+    # Largest page a GraphQL connection returns, whatever `first` asks for.
+    "RELAY_CONNECTION_MAX_LIMIT": env.int("STORE_GRAPHQL_MAX_PAGE_SIZE", default=100),
+}
+
+# Static limits checked before a GraphQL operation runs; unpaginated lists count as STORE_GRAPHQL_LIST_SIZE rows.
+STORE_GRAPHQL_MAX_DEPTH = env.int("STORE_GRAPHQL_MAX_DEPTH", default=10)
+STORE_GRAPHQL_MAX_COST = env.int("STORE_GRAPHQL_MAX_COST", default=10000)
+STORE_GRAPHQL_LIST_SIZE = env.int("STORE_GRAPHQL_LIST_SIZE", default=10)
+# Parsed and validated GraphQL documents kept per worker.
+STORE_GRAPHQL_DOCUMENT_CACHE_SIZE = env.int("STORE_GRAPHQL_DOCUMENT_CACHE_SIZE", default=1000)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(weeks=1),
@@ -182,6 +197,42 @@ SPECTACULAR_SETTINGS = {
 }
 
 
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f'redis://{env("STORE_CELERY_REDIS_HOST")}:{env("STORE_CELERY_REDIS_PORT")}/{env("STORE_REDIS_CACHE_DB", default=1)}',
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        },
+        "KEY_PREFIX": "store",
+    }
+}
+
+STORE_CACHE_TIMEOUT = env.int("STORE_CACHE_TIMEOUT", default=60 * 15)
+
+# Image renditions are generated at store.renditions.DEFAULT_WIDTHS in DEFAULT_FORMATS;
+# set STORE_IMAGE_RENDITION_WIDTHS ({name: width}) or STORE_IMAGE_RENDITION_FORMATS here to override them.
+
+# Rows fetched per round trip by the server-side cursor of the catalog export.
+STORE_EXPORT_CHUNK_SIZE = env.int("STORE_EXPORT_CHUNK_SIZE", default=2000)
+
+# Seconds a checkout holds reserved stock before it goes back on sale.
+STORE_RESERVATION_TTL = env.int("STORE_RESERVATION_TTL", default=15 * 60)
+
+# "store.carts.RedisCartBackend" keeps carts in Redis and writes them back in batches.
+STORE_CART_BACKEND = env("STORE_CART_BACKEND", default="store.carts.DatabaseCartBackend")
+STORE_CART_TTL = env.int("STORE_CART_TTL", default=60 * 60 * 24 * 7)
+
+# Outbox events are retried this many times before they are left for inspection.
+STORE_OUTBOX_MAX_ATTEMPTS = env.int("STORE_OUTBOX_MAX_ATTEMPTS", default=5)
+
+# Seconds a drain worker holds a claimed batch before another worker may take it over.
+STORE_OUTBOX_LEASE = env.int("STORE_OUTBOX_LEASE", default=5 * 60)
+
+# Seconds a failed outbox event waits before its first retry, doubled after every further failure.
+STORE_OUTBOX_BACKOFF = env.int("STORE_OUTBOX_BACKOFF", default=30)
+
+
 CELERY_RESULT_BACKEND = f'redis://{env("STORE_CELERY_REDIS_HOST")}:{env("STORE_CELERY_REDIS_PORT")}/{env("STORE_REDIS_ASYNC_DB")}'
 CELERY_BROKER_URL = f"redis://{env("STORE_CELERY_REDIS_HOST")}:{env("STORE_CELERY_REDIS_PORT")}/{env("STORE_REDIS_ASYNC_DB")}"
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
@@ -189,6 +240,25 @@ CELERY_TASK_REJECT_ON_WORKER_LOST = True
 CELERY_TASK_RESULT_EXPIRES = 3600
 CELERY_TASK_ACKS_LATE = True
 
+CELERY_BEAT_SCHEDULE = {
+    "apply-discount-schedule": {
+        "task": "store.tasks.apply_discount_schedule",
+        "schedule": 60.0,
+    },
+    "release-expired-stock-reservations": {
+        "task": "store.tasks.release_expired_stock_reservations",
+        "schedule": 60.0,
+    },
+    "persist-carts": {
+        "task": "store.tasks.persist_carts",
+        "schedule": 30.0,
+    },
+    "drain-outbox": {
+        "task": "store.tasks.drain_outbox",
+        "schedule": 5.0,
+    },
+}
+
 
 LOG_DIR = Path(gettempdir())/"store_logs" if not DEBUG else BASE_DIR / "logs"
 
@@ -0,0 +1,80 @@
+from functools import partial
+
+from graphene_django.settings import graphene_settings
+from graphene.types import Field, Int, String
+from graphene import relay
+
+from graphql_relay.utils import base64, unbase64
+from graphql.error import GraphQLError
+
+from core.loaders import get_loaders
+
+
+CURSOR_PREFIX = "pk:"
+
+_connections = {}
+
+
+def connection_for(node_type):
+    """The Relay connection type of `node_type`, created once per type."""
+    if node_type not in _connections:
+        meta = type("Meta", (), {"node": node_type})
+        _connections[node_type] = type(f"{node_type._meta.name}Connection", (relay.Connection,), {"Meta": meta})
+    return _connections[node_type]
+
+
+def encode_cursor(pk):
+    return base64(f"{CURSOR_PREFIX}{pk}")
+
+
+def decode_cursor(cursor):
+    value = unbase64(cursor)
+    if not value.startswith(CURSOR_PREFIX):
+        raise GraphQLError("Invalid cursor.")
+    try:
+        return int(value[len(CURSOR_PREFIX):])
+    except ValueError:
+        raise GraphQLError("Invalid cursor.")
+
+
+class KeysetConnectionField(Field):
+    """
+    A Relay connection over the queryset returned by the field's resolver,
+    paginated forwards with `first`/`after`.
+
+    Pages are keyset queries on the primary key, `WHERE pk > after ORDER BY
+    pk LIMIT first + 1`, so a page costs the same wherever it starts and
+    never loads more than `RELAY_CONNECTION_MAX_LIMIT` rows. The rows of a
+    page are handed to the request's loaders for their nested relations.
+    """
+
+    def __init__(self, node_type, **kwargs):
+        kwargs.setdefault("first", Int(description="Number of items to return, at most the configured maximum"))
+        kwargs.setdefault("after", String(description="Return the items after this cursor"))
+        super().__init__(connection_for(node_type), **kwargs)
+
+    @property
+    def max_page_size(self):
+        return graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+
+    def resolve_connection(self, resolver, root, info, first=None, after=None, **args):
+        if first is not None and first < 0:
+            raise GraphQLError("`first` must be a non-negative integer.")
+        page_size = min(first if first is not None else self.max_page_size, self.max_page_size)
+
+        queryset = resolver(root, info, **args).order_by("pk")
+        if after is not None:
+            queryset = queryset.filter(pk__gt=decode_cursor(after))
+        rows = get_loaders(info).collect(queryset[:page_size + 1])
+
+        connection_type = self.type
+        edges = [connection_type.Edge(node=row, cursor=encode_cursor(row.pk)) for row in rows[:page_size]]
+        page_info = relay.PageInfo(
+            has_next_page=len(rows) > page_size,
+            has_previous_page=after is not None,
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None)
+        return connection_type(edges=edges, page_info=page_info)
+
+    def wrap_resolve(self, parent_resolver):
+        return partial(self.resolve_connection, super().wrap_resolve(parent_resolver))
@@ -0,0 +1,236 @@
+from collections import OrderedDict, namedtuple
+import threading
+import hashlib
+import json
+
+from django.http import HttpResponseNotAllowed
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.conf import settings
+
+from graphene_django.views import GraphQLView, HttpError
+from graphene_django.settings import graphene_settings
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene.validation import depth_limit_validator
+
+from graphql import (ExecutionResult, FieldNode, FragmentSpreadNode, InlineFragmentNode, IntValueNode,
+                     OperationType, execute, get_named_type, get_nullable_type, get_operation_ast,
+                     is_list_type, parse, print_ast, validate, validate_schema)
+from graphql.validation import ValidationRule, specified_rules
+from graphql.error import GraphQLError
+
+from core.middlewares import OperationAuthentication
+
+
+def query_cost_validator(max_cost, page_size, list_size):
+    """
+    A validation rule rejecting operations whose static cost exceeds `max_cost`.
+
+    Every field with a selection costs 1 plus the cost of its selection,
+    multiplied by the number of rows it can return: its literal `first`
+    argument, `page_size` for a paginated field without one (or with a
+    variable), and `list_size` for an unpaginated list. Scalars and
+    introspection fields are free.
+    """
+
+    class QueryCostValidator(ValidationRule):
+        def enter_operation_definition(self, node, *_args):
+            root_type = self.context.schema.get_root_type(node.operation)
+            cost = self.selection_cost(root_type, node.selection_set, set())
+            if cost > max_cost:
+                self.report_error(GraphQLError(
+                    f"'{node.name.value if node.name else 'anonymous'}' has a cost of {cost}, "
+                    f"above the maximum of {max_cost}.", [node]))
+
+        def multiplier(self, parent_type, field, node):
+            if "first" in field.args:
+                first = next((argument.value for argument in node.arguments
+                              if argument.name.value == "first"), None)
+                return min(int(first.value), page_size) if isinstance(first, IntValueNode) else page_size
+            # The edges of a connection are already counted by its `first`.
+            if is_list_type(get_nullable_type(field.type)) and not parent_type.name.endswith("Connection"):
+                return list_size
+            return 1
+
+        def selection_cost(self, parent_type, selection_set, fragments):
+            cost = 0
+            for selection in selection_set.selections:
+                if isinstance(selection, FieldNode):
+                    fields = getattr(parent_type, "fields", {})
+                    field = fields.get(selection.name.value)
+                    if field is None or selection.selection_set is None:
+                        continue
+                    child_cost = self.selection_cost(get_named_type(field.type), selection.selection_set, fragments)
+                    cost += self.multiplier(parent_type, field, selection) * (1 + child_cost)
+                elif isinstance(selection, InlineFragmentNode):
+                    fragment_type = parent_type
+                    if selection.type_condition is not None:
+                        fragment_type = self.context.schema.get_type(selection.type_condition.name.value)
+                    cost += self.selection_cost(fragment_type, selection.selection_set, fragments)
+                elif isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.context.get_fragment(name)
+                    if fragment is None or name in fragments:
+                        continue
+                    fragment_type = self.context.schema.get_type(fragment.type_condition.name.value)
+                    cost += self.selection_cost(fragment_type, fragment.selection_set, fragments | {name})
+            return cost
+
+    return QueryCostValidator
+
+
+# A validated document and the SHA-256 of its normalized text, identical for queries differing only in layout.
+PreparedDocument = namedtuple("PreparedDocument", ["document", "digest"])
+
+
+class DocumentCache:
+    """A thread-safe LRU of parsed and validated documents, keyed by schema and SHA-256."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.documents = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            document = self.documents.get(key)
+            if document is not None:
+                self.documents.move_to_end(key)
+            return document
+
+    def set(self, key, document):
+        with self.lock:
+            self.documents[key] = document
+            self.documents.move_to_end(key)
+            while len(self.documents) > self.maxsize:
+                self.documents.popitem(last=False)
+
+
+class PersistedGraphQLView(GraphQLView):
+    """
+    `GraphQLView` with static depth and cost limits, persisted queries and
+    authentication checked once per operation (see `OperationAuthentication`).
+
+    Documents are parsed and validated, limits included, once per worker
+    and kept in an LRU keyed by their SHA-256, so a repeated query goes
+    straight to execution. Clients may send only that hash, following the
+    Apollo automatic persisted queries protocol: an unknown hash answers
+    `PersistedQueryNotFound` and the client retries with the query text,
+    which is then registered in the shared cache for every worker.
+    """
+    PERSISTED_PREFIX = "graphql:persisted"
+
+    authentication = OperationAuthentication()
+
+    documents = DocumentCache(getattr(settings, "STORE_GRAPHQL_DOCUMENT_CACHE_SIZE", 1000))
+
+    def __init__(self, authentication=None, **kwargs):
+        if authentication is not None:
+            self.authentication = authentication
+        kwargs.setdefault("validation_rules", [
+            *specified_rules,
+            depth_limit_validator(getattr(settings, "STORE_GRAPHQL_MAX_DEPTH", 10)),
+            query_cost_validator(getattr(settings, "STORE_GRAPHQL_MAX_COST", 10000),
+                                 graphene_settings.RELAY_CONNECTION_MAX_LIMIT,
+                                 getattr(settings, "STORE_GRAPHQL_LIST_SIZE", 10)),
+        ])
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def get_persisted_hash(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions") or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                extensions = {}
+        return (extensions.get("persistedQuery") or {}).get("sha256Hash")
+
+    def get_document(self, query, persisted_hash):
+        """The `PreparedDocument` of the request, or an `ExecutionResult` with its errors."""
+        key = hashlib.sha256(query.encode()).hexdigest() if query else persisted_hash
+        if query and persisted_hash and persisted_hash != key:
+            return ExecutionResult(errors=[GraphQLError("provided sha does not match query")])
+
+        prepared = self.documents.get((self.schema, key))
+        if prepared is not None:
+            return prepared
+
+        if not query:
+            query = cache.get(f"{self.PERSISTED_PREFIX}:{key}")
+            if query is None:
+                return ExecutionResult(errors=[GraphQLError(
+                    "PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"})])
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            return ExecutionResult(errors=[error])
+
+        validation_errors = validate(
+            self.schema.graphql_schema, document, self.validation_rules, graphene_settings.MAX_VALIDATION_ERRORS)
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        if persisted_hash:
+            cache.set(f"{self.PERSISTED_PREFIX}:{key}", query, timeout=None)
+        prepared = PreparedDocument(document, hashlib.sha256(print_ast(document).encode()).hexdigest())
+        self.documents.set((self.schema, key), prepared)
+        return prepared
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        persisted_hash = self.get_persisted_hash(request, data)
+        if not query and not persisted_hash:
+            return super().execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql)
+
+        schema = self.schema.graphql_schema
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        prepared = self.get_document(query, persisted_hash)
+        if isinstance(prepared, ExecutionResult):
+            return prepared
+
+        operation_ast = get_operation_ast(prepared.document, operation_name)
+        if (request.method.lower() == "get" and operation_ast is not None
+                and operation_ast.operation != OperationType.QUERY):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ["POST"], f"Can only perform a {operation_ast.operation.value} operation from a POST request."))
+
+        try:
+            self.authentication.check(request, self.schema, prepared.document, operation_ast)
+        except GraphQLError as error:
+            return ExecutionResult(errors=[error])
+
+        return self.execute_operation(request, prepared, operation_ast, variables, operation_name)
+
+    def execute_operation(self, request, prepared, operation_ast, variables, operation_name):
+        """Run the selected operation of a validated document."""
+        schema, document = self.schema.graphql_schema, prepared.document
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+                    and (graphene_settings.ATOMIC_MUTATIONS is True
+                         or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True)):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
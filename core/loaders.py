@@ -0,0 +1,122 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from core.models import OTP, User
+
+
+class DataLoader(ABC):
+    """
+    Per-request batching of related rows for synchronous graphene resolvers.
+
+    graphql-core resolves a sync schema depth first with nothing to defer
+    to, so a loader cannot wait for its siblings' keys the way an async
+    DataLoader does. Instead the keys are queued as soon as the rows holding
+    them are fetched (see `Loaders.collect`), and the first `load` fetches
+    every queued key in one query; later loads are cache hits.
+
+    Subclasses set `parent` and `parent_key`, the model whose rows carry the
+    keys and the attribute holding it, and implement `batch_load`.
+    """
+    parent = None
+    parent_key = None
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self.cache = {}
+        self.queue = set()
+
+    def default(self):
+        return None
+
+    @abstractmethod
+    def batch_load(self, keys):
+        """A mapping of key to value for the given keys; missing keys get `default()`."""
+
+    def rows(self, values):
+        """The model instances among the loaded values, so the loaders they feed get primed."""
+        return [value for value in values if value is not None]
+
+    def prime(self, keys):
+        self.queue.update(key for key in keys if key is not None and key not in self.cache)
+
+    def load(self, key):
+        if key is None:
+            return self.default()
+        if key not in self.cache:
+            self.prime([key])
+            keys, self.queue = self.queue, set()
+            found = self.batch_load(keys)
+            for queued in keys:
+                self.cache[queued] = found.get(queued, self.default())
+            self.loaders.collect(self.rows(found.values()))
+        return self.cache[key]
+
+
+class ModelLoader(DataLoader):
+    """Rows of `queryset` by primary key."""
+    queryset = None
+
+    def batch_load(self, keys):
+        return self.queryset.in_bulk(keys)
+
+
+class RelatedLoader(DataLoader):
+    """Lists of `queryset` rows sharing a value of the foreign key `field`."""
+    queryset = None
+    field = None
+
+    def default(self):
+        return []
+
+    def batch_load(self, keys):
+        attname = self.queryset.model._meta.get_field(self.field).attname
+        grouped = defaultdict(list)
+        for row in self.queryset.filter(**{f"{attname}__in": keys}):
+            grouped[getattr(row, attname)].append(row)
+        return grouped
+
+    def rows(self, values):
+        return [row for group in values for row in group]
+
+
+class Loaders:
+    """The loaders of one GraphQL request, created on first use."""
+    registry = []
+
+    def __init__(self):
+        self.instances = {}
+
+    @classmethod
+    def register(cls, loader_class):
+        cls.registry.append(loader_class)
+        return loader_class
+
+    def __getitem__(self, loader_class):
+        if loader_class not in self.instances:
+            self.instances[loader_class] = loader_class(self)
+        return self.instances[loader_class]
+
+    def collect(self, rows):
+        """List `rows` and queue the keys they hold in every loader fed by their model."""
+        rows = list(rows)
+        if rows:
+            model = type(rows[0])
+            for loader_class in self.registry:
+                if loader_class.parent is not None and issubclass(model, loader_class.parent):
+                    self[loader_class].prime(getattr(row, loader_class.parent_key) for row in rows)
+        return rows
+
+
+def get_loaders(info):
+    """The `Loaders` of the request being resolved, kept on the request itself."""
+    context = info.context
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = context.loaders = Loaders()
+    return loaders
+
+
+@Loaders.register
+class OTPUserLoader(ModelLoader):
+    queryset = User.objects.all()
+    parent, parent_key = OTP, "user_id"
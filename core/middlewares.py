@@ -1,8 +1,77 @@
+from graphene.utils.str_converters import to_camel_case
 
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.shortcuts import get_user_by_token
+from graphql_jwt.utils import get_credentials
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, OperationType
+from graphql.error import GraphQLError
 
-class AuthenticationMiddleware:
-    def resolve(self, next, root, info, **args):
-        user = info.context.user
-        if not user.is_authenticated:
-            raise Exception("Authentication required")
-        return next(root, info, **args)
+
+def allow_any(*field_names):
+    """
+    Class decorator exempting root fields of a graphene `ObjectType` from
+    authentication; every field of the class when no names are given.
+    """
+    def decorate(cls):
+        fields = cls._meta.fields
+        cls.public_fields = frozenset(
+            fields[name].name or to_camel_case(name) for name in field_names or fields)
+        return cls
+    return decorate
+
+
+def public_fields(graphene_type):
+    """Names of the public root fields of `graphene_type`, including those declared on its bases."""
+    return frozenset().union(*(vars(base).get("public_fields", ()) for base in graphene_type.__mro__))
+
+
+class OperationAuthentication:
+    """
+    Authentication checked once per GraphQL operation instead of once per
+    resolved field.
+
+    The operation's root fields are collected from the document before it
+    runs; when any of them is not public (see `allow_any`) the request's
+    user, from the session or a JWT, must be authenticated. Nested fields
+    are covered by the decision taken for their root field.
+    """
+
+    def authenticate(self, request):
+        """Resolve the request's user from a JWT, once, when the session did not already."""
+        if not request.user.is_authenticated:
+            token = get_credentials(request)
+            if token:
+                request.user = get_user_by_token(token, request)
+        return request.user
+
+    def root_fields(self, document, selection_set, seen=frozenset()):
+        names = set()
+        fragments = {definition.name.value: definition for definition in document.definitions
+                     if getattr(definition, "type_condition", None) is not None}
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                names.add(selection.name.value)
+            elif isinstance(selection, InlineFragmentNode):
+                names |= self.root_fields(document, selection.selection_set, seen)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                if name in fragments and name not in seen:
+                    names |= self.root_fields(document, fragments[name].selection_set, seen | {name})
+        return names
+
+    def check(self, request, schema, document, operation_ast):
+        """Raise a `GraphQLError` unless the operation may run for the request's user."""
+        if operation_ast is None:
+            return
+        root_type = schema.mutation if operation_ast.operation == OperationType.MUTATION else schema.query
+        protected = {name for name in self.root_fields(document, operation_ast.selection_set)
+                     if not name.startswith("__")} - public_fields(root_type)
+        try:
+            user = self.authenticate(request)
+        except JSONWebTokenError as error:
+            # A stale token does not stop a client from reading public fields.
+            if protected:
+                raise GraphQLError(str(error))
+            return
+        if protected and not user.is_authenticated:
+            raise GraphQLError("Authentication required")
@@ -1,7 +1,10 @@
 from graphql_jwt import (ObtainJSONWebToken, Verify, Refresh)
 from graphene.types import ObjectType
 
+from core.middlewares import allow_any
 
+
+@allow_any()
 class AuthMutation(ObjectType):
     token_auth = ObtainJSONWebToken.Field()
     verify_token = Verify.Field()
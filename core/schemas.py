@@ -1,6 +1,8 @@
 from graphene.types import ObjectType, Field, List, ID
 from graphene_django.types import DjangoObjectType
-from graphql_jwt.decorators import login_required
+from graphql_jwt.decorators import login_required, staff_member_required
+from core.connections import KeysetConnectionField
+from core.loaders import OTPUserLoader, get_loaders
 from core.models import User, OTP
 
 
@@ -8,23 +10,43 @@ class UserType(DjangoObjectType):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name',
-                  'last_name', 'phone_number', 'password']
+                  'last_name', 'phone_number']
 
 
 class OTPType(DjangoObjectType):
     class Meta:
         model = OTP
-        fields = ['id', 'user', 'otp_code', 'created_at']
+        fields = ['id', 'user', 'created_at']
+
+    def resolve_user(self, info):
+        return get_loaders(info)[OTPUserLoader].load(self.user_id)
 
 
 class Query(ObjectType):
-    all_users = List(UserType, description="Get all users")
+    all_users = KeysetConnectionField(UserType, description="Get all users, staff only")
     user_by_id = Field(UserType, id=ID(required=True),
-                       description="Get user by ID")
-    me = Field(UserType, id=ID(required=True), description="Get current user")
-    all_otps = List(OTPType, description="Get all OTPs")
+                       description="Get user by ID, staff only")
+    me = Field(UserType, description="Get current user")
+    all_otps = List(OTPType, description="Get the current user's OTPs")
     otp_by_id = Field(OTPType, id=ID(required=True),
-                      description="Get OTP by ID")
+                      description="Get one of the current user's OTPs by ID")
 
+    @staff_member_required
     def resolve_all_users(self, info):
         return User.objects.all()
+
+    @staff_member_required
+    def resolve_user_by_id(self, info, id):
+        return User.objects.filter(pk=id).first()
+
+    @login_required
+    def resolve_me(self, info):
+        return info.context.user
+
+    @login_required
+    def resolve_all_otps(self, info):
+        return get_loaders(info).collect(OTP.objects.filter(user=info.context.user).order_by("-created_at"))
+
+    @login_required
+    def resolve_otp_by_id(self, info, id):
+        return OTP.objects.filter(pk=id, user=info.context.user).first()
@@ -1,3 +1,23 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from core.graphql import schema
+from core.models import OTP, User
+
+
+class OTPGraphQLQueryCountTests(TestCase):
+    QUERY = "{ allOtps { id user { phoneNumber } } }"
+
+    def execute(self, user):
+        request = RequestFactory().post("/graphql/")
+        request.user = user
+        result = schema.execute(self.QUERY, context_value=request)
+        self.assertIsNone(result.errors)
+        return result.data["allOtps"]
+
+    def test_otp_users_are_batched(self):
+        user = User.objects.create_user(phone_number="09120000000", password="password")
+        OTP.objects.bulk_create([OTP(user=user, otp_code=f"{index:06}") for index in range(5)])
+        # The OTPs and their users.
+        with self.assertNumQueries(2):
+            otps = self.execute(user)
+        self.assertEqual([otp["user"]["phoneNumber"] for otp in otps], [user.phone_number] * 5)
@@ -33,3 +33,7 @@ class CoreUtils:
     @sms_sender
     def send_otp(self, phone_number, otp):
         logger.info(f"Sending OTP ({otp}) to user {phone_number}")
+
+    @sms_sender
+    def send_notification(self, phone_number, message, kind="notify"):
+        logger.info(f"Sending notification to user {phone_number}")
@@ -0,0 +1,4 @@
+#! /bin/bash
+
+# Same worker count as server.sh, so the two paths can be benchmarked against each other.
+gunicorn --bind 0.0.0.0:8001 --workers 2 --worker-class uvicorn_worker.UvicornWorker config.asgi:application
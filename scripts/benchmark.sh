@@ -0,0 +1,21 @@
+#! /bin/bash
+
+# Throughput of the product read endpoints on the WSGI (server.sh, :8000) and
+# ASGI (asgi.sh, :8001) servers. Both run the same number of workers.
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+USERS=${USERS:-50}
+DURATION=${DURATION:-60s}
+
+run() {
+    STORE_BENCHMARK_PREFIX=$3 locust -f "$SCRIPT_DIR/locustfile.py" --headless --only-summary \
+        --users "$USERS" --spawn-rate "$USERS" --run-time "$DURATION" \
+        --host "$2" --csv "/tmp/benchmark_$1" > /dev/null 2>&1
+}
+
+run wsgi http://localhost:8000 /store
+run asgi http://localhost:8001 /store/async
+
+for name in wsgi asgi; do
+    awk -F, -v name=$name '$2 == "Aggregated" { printf "%s: %.1f req/s, median %s ms, p95 %s ms, %s failures\n", name, $10, $5, $17, $4 }' \
+        "/tmp/benchmark_${name}_stats.csv"
+done
@@ -0,0 +1,123 @@
+"""
+Cost of authenticating a large GraphQL result per field versus once per operation.
+
+Runs the same authenticated `allProducts` query through `StoreGraphQLView`,
+first with the former per-field authentication middleware, then with the
+operation-level check, and prints the median request time and the number of
+authentication checks of each. Sample rows are created in a transaction
+that is rolled back.
+
+    DJANGO_SETTINGS_MODULE=config.settings python scripts/graphql_auth_benchmark.py --rows 1000
+"""
+from pathlib import Path
+import statistics
+import argparse
+import time
+import json
+import sys
+import os
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory
+from django.db import transaction
+
+from graphene_django.settings import graphene_settings
+
+from core.middlewares import OperationAuthentication
+
+from store.graphql import StoreGraphQLView, schema
+from store.models import Category, Product
+
+
+QUERY = """
+query Benchmark($first: Int) {
+  allProducts(first: $first) { edges { node { id title unitPrice stock description category { name } } } }
+}
+"""
+
+
+class PerFieldAuthentication:
+    """The former middleware: an `is_authenticated` check around every resolved field."""
+
+    def __init__(self):
+        self.checks = 0
+
+    def resolve(self, next, root, info, **args):
+        self.checks += 1
+        if not info.context.user.is_authenticated:
+            raise Exception("Authentication required")
+        return next(root, info, **args)
+
+
+class CountingAuthentication(OperationAuthentication):
+    def __init__(self):
+        self.checks = 0
+
+    def check(self, *args):
+        self.checks += 1
+        return super().check(*args)
+
+
+class NoAuthentication:
+    def check(self, *args):
+        pass
+
+
+def measure(view, user, rows, repeat):
+    factory = RequestFactory()
+    timings = []
+    for _ in range(repeat):
+        request = factory.post("/store/graphql/", json.dumps({"query": QUERY, "variables": {"first": rows}}),
+                               content_type="application/json")
+        request.user = user
+        started = time.perf_counter()
+        response = view(request)
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.content
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    options = parser.parse_args()
+
+    # Let a single page hold every sample row.
+    graphene_settings.RELAY_CONNECTION_MAX_LIMIT = max(options.rows, graphene_settings.RELAY_CONNECTION_MAX_LIMIT)
+
+    with transaction.atomic():
+        user = get_user_model().objects.create_user(phone_number="09000000000", password="benchmark")
+        category = Category.objects.create(name="benchmark")
+        Product.objects.bulk_create([
+            Product(title=f"benchmark {index}", slug=f"benchmark-{index}", description="benchmark",
+                    unit_price=index + 1, stock=1, category=category)
+            for index in range(options.rows)
+        ])
+
+        per_field = PerFieldAuthentication()
+        per_operation = CountingAuthentication()
+        results = {
+            "per field": (measure(StoreGraphQLView.as_view(
+                schema=schema, middleware=[*graphene_settings.MIDDLEWARE, per_field], authentication=NoAuthentication()),
+                user, options.rows, options.repeat), per_field),
+            "per operation": (measure(StoreGraphQLView.as_view(
+                schema=schema, authentication=per_operation),
+                user, options.rows, options.repeat), per_operation),
+        }
+        transaction.set_rollback(True)
+
+    for name, (median, authentication) in results.items():
+        print(f"{name:>13}: {median * 1000:8.1f} ms median, "
+              f"{authentication.checks // options.repeat} auth checks per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import random
+import os
+
+from locust import HttpUser, between, task
+
+
+# "/store" for the WSGI viewsets, "/store/async" for the async views.
+PREFIX = os.environ.get("STORE_BENCHMARK_PREFIX", "/store")
+
+
+class CatalogReader(HttpUser):
+    """Anonymous catalog browsing: listings, facets and product pages."""
+    wait_time = between(0, 0.1)
+
+    def on_start(self):
+        response = self.client.get(f"{PREFIX}/product/", name="list")
+        # List items link to their detail page; the slug is the last segment of that URL.
+        self.slugs = [product["url"].rstrip("/").rsplit("/", 1)[-1]
+                      for product in response.json().get("results", [])] or ["missing"]
+
+    def price_filter(self):
+        # Spread requests over many cache keys, so queries run and not only cache reads.
+        return {"min_price": random.randint(0, 500)}
+
+    @task(4)
+    def product_list(self):
+        self.client.get(f"{PREFIX}/product/", params=self.price_filter(), name="list")
+
+    @task(2)
+    def product_detail(self):
+        self.client.get(f"{PREFIX}/product/{random.choice(self.slugs)}/", name="detail")
+
+    @task(1)
+    def product_facets(self):
+        self.client.get(f"{PREFIX}/product/facets/", params=self.price_filter(), name="facets")
@@ -6,11 +6,13 @@ supervisorctl -c supervisord.conf shutdown
 
 echo "Supervisor stopped successfully!"
 
-PIDS=$(sudo lsof -t -i :8000)
-if [[ -n "$PIDS" ]]; then
-    echo "Stopping processes on port 8000..."
-    sudo kill -9 $PIDS
-    echo "Process on port 8000 stopped."
-else
-    echo "No web service on port 8000 is running."
-fi
+for PORT in 8000 8001; do
+    PIDS=$(sudo lsof -t -i :$PORT)
+    if [[ -n "$PIDS" ]]; then
+        echo "Stopping processes on port $PORT..."
+        sudo kill -9 $PIDS
+        echo "Process on port $PORT stopped."
+    else
+        echo "No web service on port $PORT is running."
+    fi
+done
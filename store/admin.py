@@ -2,10 +2,13 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify
 from django.contrib import admin
+from django.db import transaction
 
 
 from store.models import (Brand, Product, Category, ProductImage, Discount, Size,
-                          Color, Cart, CartItem, OrderItem, UserProfile, Order, Address, Review)
+                          Color, Cart, CartItem, OrderItem, UserProfile, Order, Address, Review, StockReservation, OutboxEvent)
+from store.reservations import release_reservations
+from store.caches import product_cache
 
 
 class ProductImageInline(admin.TabularInline):
@@ -67,7 +70,10 @@ class ProductAdmin(admin.ModelAdmin):
 
     def empty_stock(self, request, queryset):
         """Clear stock for selected products."""
-        queryset.update(stock=0)
+        with transaction.atomic():
+            product_ids = list(queryset.values_list("pk", flat=True))
+            queryset.update(stock=0, is_available=False)
+            OutboxEvent.publish(OutboxEvent.STOCK_CHANGED, {"products": product_ids})
         self.message_user(request, _("Stock for selected products cleared."))
     empty_stock.short_description = _("Clear Stock")
 
@@ -85,8 +91,10 @@ class ReviewAdmin(admin.ModelAdmin):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("name",)
+    list_display = ("name", "parent", "product_count")
     search_fields = ("name", "description")
+    readonly_fields = ("path", "depth", "product_count")
+    ordering = ("path",)
 
 
 @admin.register(Discount)
@@ -100,10 +108,34 @@ class DiscountAdmin(admin.ModelAdmin):
 
     def devalidate_Discount(self, request, queryset):
         queryset.update(end_date=timezone.now())
+        Product.objects.filter(discount__in=queryset).recompute_discount_prices()
+        # Neither UPDATE sends signals, so cached listings would keep the old prices.
+        product_cache.invalidate_products()
         self.message_user(request, _("Discounts deactivated successfully."))
     devalidate_Discount.short_description = _("Deactivate Discounts")
 
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("product", "cart", "quantity", "created_at", "expires_at")
+    list_select_related = ("product", "cart")
+    ordering = ("expires_at",)
+    actions = ["release"]
+
+    def release(self, request, queryset):
+        """Put the reserved stock back on sale."""
+        released = release_reservations(queryset)
+        self.message_user(request, _("%(count)d reservations released.") % {"count": released})
+    release.short_description = _("Release Reservations")
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "topic", "created_at", "processed_at", "attempts")
+    list_filter = ("topic", "processed_at")
+    readonly_fields = ("topic", "payload", "created_at", "processed_at", "attempts", "last_error")
+
+
 @admin.register(Size)
 class SizeAdmin(admin.ModelAdmin):
     list_display = ("value",)
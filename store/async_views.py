@@ -0,0 +1,99 @@
+"""
+Async versions of the product read endpoints, meant to be served by an ASGI
+worker (see `scripts/asgi.sh`).
+
+Filtering, ordering, pagination and serialization are those of
+`ProductViewSet`; only the I/O changes: queries go through the async ORM
+(`aiterator`, `aaggregate`, `afirst`) and the response cache through
+`redis.asyncio`, so a worker keeps serving other requests while one waits
+on Postgres or Redis. API errors, such as an invalid filter or cursor,
+get the status and JSON body `ProductViewSet` would answer.
+"""
+from functools import wraps
+
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from store.filters import ProductSearchFilter
+from store.caches import product_cache
+from store.facets import ProductFacets
+from store.models import Product
+from store.views import ProductViewSet
+
+
+def json_response(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json")
+
+
+def api_errors(view_func):
+    """Answer the exceptions DRF handles through its exception handler, as the viewsets do."""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view_func(request, *args, **kwargs)
+        except (APIException, Http404, PermissionDenied) as exc:
+            response = api_settings.EXCEPTION_HANDLER(exc, {"request": request, "args": args, "kwargs": kwargs})
+            if response is None:
+                raise
+            error = json_response(response.data, status=response.status_code)
+            for name, value in response.items():
+                error[name] = value
+            return error
+    return wrapper
+
+
+def product_view(request, action, **kwargs):
+    """A `ProductViewSet` set up for `request` as the router would, without dispatching it."""
+    view = ProductViewSet(action_map={"get": action}, args=(), kwargs=kwargs, format_kwarg=None)
+    view.request = view.initialize_request(request)
+    view.headers = {}
+    return view
+
+
+@api_errors
+async def product_list(request):
+    view = product_view(request, "list")
+    queryset = view.filter_queryset(view.get_queryset())
+
+    async def render():
+        page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+        serializer = view.get_serializer(page, many=True)
+        return view.paginator.get_paginated_response(serializer.data).data
+
+    return await product_cache.arespond(
+        product_cache.PRODUCT_LIST, view.request, render,
+        lambda: view.awatermark(queryset),
+        params=view.get_cache_params(), response_class=json_response)
+
+
+@api_errors
+async def product_detail(request, slug):
+    view = product_view(request, "retrieve", slug=slug)
+    document = {}
+
+    async def watermark():
+        document.update(await view.aget_document(slug))
+        return (document["updated_at"],)
+
+    async def render():
+        return document["body"]
+
+    return await product_cache.arespond(
+        product_cache.product_detail(slug), view.request, render, watermark,
+        params=view.get_cache_params(),
+        response_class=lambda body: HttpResponse(body, content_type="application/json"))
+
+
+@api_errors
+async def product_facets(request):
+    view = product_view(request, "facets")
+    queryset = ProductSearchFilter().filter_queryset(view.request, Product.objects.all(), view)
+    return await product_cache.arespond(
+        product_cache.PRODUCT_LIST, view.request,
+        lambda: ProductFacets(queryset, view.request, view.filterset_class).acompute(),
+        lambda: view.awatermark(queryset),
+        params=view.get_cache_params(), response_class=json_response)
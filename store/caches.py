@@ -0,0 +1,321 @@
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlencode
+import hashlib
+import logging
+import json
+import math
+import time
+import asyncio
+import weakref
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.conf import settings
+
+from rest_framework.response import Response
+
+
+logger = logging.getLogger("store")
+
+
+class AsyncCache:
+    """
+    Non-blocking access to a Django cache for async views.
+
+    With django-redis the keys are read and written through `redis.asyncio`,
+    using the sync client's own key format and serializer, so sync and async
+    views share entries and namespace versions. Any other backend falls back
+    to Django's async cache API.
+    """
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+        self._connections = weakref.WeakKeyDictionary()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @property
+    def client(self):
+        """The django-redis client of the backend, or None when the backend is not django-redis."""
+        client = getattr(self.backend, "client", None)
+        return client if all(hasattr(client, name) for name in ("encode", "decode", "make_key")) else None
+
+    @property
+    def redis(self):
+        """An asyncio Redis connection pool, one per event loop since connections cannot cross loops."""
+        import redis.asyncio
+
+        loop = asyncio.get_running_loop()
+        if loop not in self._connections:
+            location = settings.CACHES[self.alias]["LOCATION"]
+            location = location if isinstance(location, str) else location[0]
+            self._connections[loop] = redis.asyncio.Redis.from_url(location)
+        return self._connections[loop]
+
+    async def get_many(self, keys):
+        client = self.client
+        if client is None:
+            return await self.backend.aget_many(keys)
+        values = await self.redis.mget([client.make_key(key) for key in keys])
+        return {key: client.decode(value) for key, value in zip(keys, values) if value is not None}
+
+    async def get(self, key, default=None):
+        return (await self.get_many([key])).get(key, default)
+
+    async def set(self, key, value, timeout):
+        client = self.client
+        if client is None:
+            return await self.backend.aset(key, value, timeout)
+        await self.redis.set(client.make_key(key), client.encode(value), ex=timeout)
+
+
+class ResponseCache:
+    """
+    Versioned cache for serialized API responses.
+
+    Every key embeds the current version of its namespace and of the whole
+    catalog, so invalidation is a single INCR and never has to scan Redis;
+    orphaned entries simply expire.
+    """
+    CATALOG = "catalog"
+    PRODUCT_LIST = "product:list"
+    CATEGORY_TREE = "category:tree"
+
+    def __init__(self, prefix="response"):
+        self.prefix = prefix
+        self.async_cache = AsyncCache()
+
+    @property
+    def timeout(self):
+        return getattr(settings, "STORE_CACHE_TIMEOUT", 60 * 15)
+
+    @staticmethod
+    def product_detail(slug):
+        return f"product:detail:{slug}"
+
+    def _version_key(self, namespace):
+        return f"{self.prefix}:version:{namespace}"
+
+    def _changed_key(self, namespace):
+        return f"{self.prefix}:changed:{namespace}"
+
+    def get_versions(self, *namespaces):
+        """Current versions of the catalog and of each namespace, read in one round trip."""
+        keys = [self._version_key(namespace) for namespace in (self.CATALOG, *namespaces)]
+        versions = cache.get_many(keys)
+        return tuple(versions.get(key, 1) for key in keys)
+
+    async def aget_versions(self, *namespaces):
+        keys = [self._version_key(namespace) for namespace in (self.CATALOG, *namespaces)]
+        versions = await self.async_cache.get_many(keys)
+        return tuple(versions.get(key, 1) for key in keys)
+
+    def bump(self, *namespaces):
+        """Invalidate every cached response under the given namespaces, recording when they changed."""
+        # Rounded up, so a response built earlier in the same second is never reported current.
+        changed_at = math.ceil(time.time())
+        for namespace in namespaces:
+            key = self._version_key(namespace)
+            cache.add(key, 1, timeout=None)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 2, timeout=None)
+        cache.set_many({self._changed_key(namespace): changed_at for namespace in namespaces}, timeout=None)
+        logger.debug(f"Response cache invalidated for {namespaces}")
+
+    def _last_changed(self, namespace, changes):
+        timestamps = [changes[key] for key in (self._changed_key(self.CATALOG), self._changed_key(namespace))
+                      if key in changes]
+        return datetime.fromtimestamp(max(timestamps), tz=dt_timezone.utc) if timestamps else None
+
+    def last_changed(self, namespace):
+        """When the catalog or `namespace` was last invalidated, or None if never."""
+        return self._last_changed(namespace, cache.get_many(
+            [self._changed_key(self.CATALOG), self._changed_key(namespace)]))
+
+    async def alast_changed(self, namespace):
+        return self._last_changed(namespace, await self.async_cache.get_many(
+            [self._changed_key(self.CATALOG), self._changed_key(namespace)]))
+
+    @staticmethod
+    def validators(watermark, last_changed, digest):
+        """
+        `ConditionalResponse` of a watermark. Its `max(updated_at)` cannot see
+        deleted rows, so the last invalidation of the namespace moves
+        Last-Modified (and with it the ETag) forward as well.
+        """
+        last_modified, *parts = watermark
+        if last_changed is not None and (last_modified is None or last_changed > last_modified):
+            last_modified = last_changed
+        return ConditionalResponse(last_modified, *parts, digest)
+
+    def invalidate_products(self, slugs=None):
+        """Invalidate the product listing and the detail of the given slugs, or everything when no slugs are given."""
+        if slugs is None:
+            namespaces = [self.CATALOG]
+        else:
+            namespaces = [self.PRODUCT_LIST, *(self.product_detail(slug) for slug in slugs)]
+        # Bump after commit so a concurrent reader cannot re-cache the old rows.
+        transaction.on_commit(lambda: self.bump(*namespaces))
+
+    def invalidate_categories(self):
+        """Invalidate the cached category tree, including its product counts."""
+        transaction.on_commit(lambda: self.bump(self.CATEGORY_TREE))
+
+    def get_or_set(self, namespace, build):
+        """Cache the result of `build()` under the current version of `namespace`."""
+        catalog_version, version = self.get_versions(namespace)
+        return cache.get_or_set(
+            f"{self.prefix}:{namespace}:{catalog_version}.{version}", build, self.timeout)
+
+    def normalize(self, request, params=None):
+        """Build a stable digest of the request URL, keeping only `params` in sorted order."""
+        query = request.query_params
+        items = []
+        for name in sorted(query):
+            if params is not None and name not in params:
+                continue
+            values = sorted(value for value in query.getlist(name) if value != "")
+            if values:
+                items.append((name, values))
+        raw = request.build_absolute_uri(request.path) + "?" + urlencode(items, doseq=True)
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def make_key(self, namespace, request, params=None):
+        catalog_version, version = self.get_versions(namespace)
+        digest = self.normalize(request, params)
+        return f"{self.prefix}:{namespace}:{catalog_version}.{version}:{digest}", digest
+
+    async def amake_key(self, namespace, request, params=None):
+        catalog_version, version = await self.aget_versions(namespace)
+        digest = self.normalize(request, params)
+        return f"{self.prefix}:{namespace}:{catalog_version}.{version}:{digest}", digest
+
+    def respond(self, namespace, request, render, watermark, params=None, response_class=Response):
+        """
+        Serve the response for this request from the cache, with ETag and
+        Last-Modified validators.
+
+        On a hit the stored validators answer conditional requests without
+        touching the database. On a miss `watermark()` runs first (one
+        aggregate query); a matching client gets its 304 right away,
+        otherwise `render()` builds the data, which is stored together with
+        its validators.
+        """
+        key, digest = self.make_key(namespace, request, params)
+        entry = cache.get(key)
+        if entry is None:
+            validators = self.validators(watermark(), self.last_changed(namespace), digest)
+            not_modified = validators.not_modified(request)
+            if not_modified is not None:
+                return not_modified
+            entry = (validators, render())
+            cache.set(key, entry, self.timeout)
+
+        validators, data = entry
+        return validators.not_modified(request) or validators.apply(response_class(data))
+
+    async def arespond(self, namespace, request, render, watermark, params=None, response_class=Response):
+        """`respond` for async views, where `render` and `watermark` are coroutine functions."""
+        key, digest = await self.amake_key(namespace, request, params)
+        entry = await self.async_cache.get(key)
+        if entry is None:
+            validators = self.validators(await watermark(), await self.alast_changed(namespace), digest)
+            not_modified = validators.not_modified(request)
+            if not_modified is not None:
+                return not_modified
+            entry = (validators, await render())
+            await self.async_cache.set(key, entry, self.timeout)
+
+        validators, data = entry
+        return validators.not_modified(request) or validators.apply(response_class(data))
+
+
+class ConditionalResponse:
+    """
+    Strong ETag / Last-Modified validators derived from a data watermark.
+
+    The watermark is whatever cheap values change whenever the response body
+    would, typically a `max(updated_at)` and a row count from one aggregate
+    query, so a revalidation never has to build the body.
+    """
+
+    def __init__(self, last_modified, *parts):
+        self.last_modified = last_modified
+        self.etag = quote_etag(hashlib.md5(
+            ":".join(str(part) for part in (last_modified, *parts)).encode()).hexdigest())
+
+    @property
+    def timestamp(self):
+        return int(self.last_modified.timestamp()) if self.last_modified else None
+
+    def not_modified(self, request):
+        """A 304 (or 412) response when the request's preconditions match, otherwise None."""
+        response = get_conditional_response(request, etag=self.etag, last_modified=self.timestamp)
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        response.headers["ETag"] = self.etag
+        if self.timestamp is not None:
+            response.headers["Last-Modified"] = http_date(self.timestamp)
+        return response
+
+
+product_cache = ResponseCache()
+
+
+class GraphQLResultCache:
+    """
+    Cached results of anonymous GraphQL queries, counting hits and misses.
+
+    Keys embed the versions `product_cache` keeps for the catalog, the
+    product listings and the category tree, so the receivers that
+    invalidate REST responses on `Product`, `ProductImage` and `Category`
+    changes drop the GraphQL results built from those rows as well. Stock
+    changes bump no version, so results selecting `stock` are never cached
+    (see `StoreGraphQLView.UNCACHED_FIELDS`).
+    """
+    NAMESPACES = (ResponseCache.PRODUCT_LIST, ResponseCache.CATEGORY_TREE)
+    HITS = "graphql:result:hits"
+    MISSES = "graphql:result:misses"
+
+    def __init__(self, responses, prefix="graphql:result"):
+        self.responses = responses
+        self.prefix = prefix
+
+    def make_key(self, digest, variables, operation_name):
+        """Key of a document digest with its variables and operation, under the current versions."""
+        versions = ".".join(str(version) for version in self.responses.get_versions(*self.NAMESPACES))
+        arguments = json.dumps([variables or {}, operation_name], sort_keys=True, default=str)
+        return f"{self.prefix}:{versions}:{digest}:{hashlib.md5(arguments.encode()).hexdigest()}"
+
+    def count(self, key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    def get(self, key):
+        data = cache.get(key)
+        self.count(self.MISSES if data is None else self.HITS)
+        return data
+
+    def set(self, key, data):
+        cache.set(key, data, self.responses.timeout)
+
+    def stats(self):
+        counts = cache.get_many([self.HITS, self.MISSES])
+        hits, misses = counts.get(self.HITS, 0), counts.get(self.MISSES, 0)
+        return {"hits": hits, "misses": misses,
+                "hit_ratio": hits / (hits + misses) if hits + misses else None}
+
+    def reset_stats(self):
+        cache.delete_many([self.HITS, self.MISSES])
+
+
+graphql_cache = GraphQLResultCache(product_cache)
@@ -0,0 +1,282 @@
+from abc import ABC, abstractmethod
+from decimal import Decimal
+import logging
+
+from django.utils.module_loading import import_string
+from django.db.models.functions import Now
+from django.db.models import F, Q
+from django.db import transaction
+from django.conf import settings
+
+from store.models import Cart, CartItem
+
+
+logger = logging.getLogger("store")
+
+CENTS = Decimal("0.01")
+
+
+def get_cart_backend():
+    """The cart backend configured by `STORE_CART_BACKEND`."""
+    return import_string(getattr(settings, "STORE_CART_BACKEND", "store.carts.DatabaseCartBackend"))()
+
+
+class BaseCartBackend(ABC):
+    """
+    Storage of cart lines. A line is a dict of `product` (id), `quantity`
+    and `price`, the line total at the product's current effective price.
+    """
+
+    @abstractmethod
+    def items(self, cart):
+        """The lines of `cart`, ordered by product."""
+
+    @abstractmethod
+    def total(self, cart):
+        """The sum of the line totals of `cart`."""
+
+    @abstractmethod
+    def add(self, cart, product, quantity):
+        """Add `quantity` units of `product`, returning the updated line."""
+
+    @abstractmethod
+    def update(self, cart, product, quantity):
+        """Set the quantity of a line, returning it, or remove it when `quantity` is 0 (returns None)."""
+
+    @abstractmethod
+    def remove(self, cart, product_id):
+        """Remove the line of `product_id` from `cart`."""
+
+    @abstractmethod
+    def clear(self, cart):
+        """Remove every line of `cart`."""
+
+    def persist(self, cart):
+        """Write the cart's lines to the `Cart`/`CartItem` tables if they live elsewhere."""
+
+    def persist_pending(self, batch_size=500):
+        """Write every cart changed since the last call to the database. Returns the number of carts written."""
+        return 0
+
+
+class DatabaseCartBackend(BaseCartBackend):
+    """Cart lines stored directly in `CartItem`, updated in place with F expressions."""
+
+    def items(self, cart):
+        return list(CartItem.objects.filter(cart=cart).order_by("pk").values("product", "quantity", "price"))
+
+    def total(self, cart):
+        return cart.calculate_total_price()
+
+    def _line(self, cart, product_id):
+        return CartItem.objects.filter(cart=cart, product_id=product_id).values(
+            "product", "quantity", "price").first()
+
+    def add(self, cart, product, quantity):
+        with transaction.atomic():
+            CartItem.objects.get_or_create(cart=cart, product=product, defaults={"quantity": 0})
+            CartItem.objects.filter(cart=cart, product=product).update(
+                quantity=F("quantity") + quantity,
+                price=(F("quantity") + quantity) * product.effective_price)
+        return self._line(cart, product.pk)
+
+    def update(self, cart, product, quantity):
+        if not quantity:
+            self.remove(cart, product.pk)
+            return None
+        CartItem.objects.update_or_create(
+            cart=cart, product=product,
+            defaults={"quantity": quantity, "price": product.effective_price * quantity})
+        return self._line(cart, product.pk)
+
+    def remove(self, cart, product_id):
+        return CartItem.objects.filter(cart=cart, product_id=product_id).delete()[0] > 0
+
+    def clear(self, cart):
+        CartItem.objects.filter(cart=cart).delete()
+
+
+# Lua keeps every read-modify-write of a cart atomic inside Redis.
+# KEYS: items hash, prices hash, total; ARGV: product id, quantity, unit price in cents, "add" or "set", ttl.
+SET_LINE_SCRIPT = """
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local old_price = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+local quantity = tonumber(ARGV[2])
+local price = tonumber(ARGV[3])
+if ARGV[4] == 'add' then quantity = old + quantity end
+if quantity <= 0 then
+    quantity = 0
+    price = 0
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+else
+    redis.call('HSET', KEYS[1], ARGV[1], quantity)
+    redis.call('HSET', KEYS[2], ARGV[1], price)
+end
+local total = redis.call('INCRBY', KEYS[3], quantity * price - old * old_price)
+for i = 1, 3 do redis.call('EXPIRE', KEYS[i], ARGV[5]) end
+return {quantity, total}
+"""
+
+# KEYS: items hash, prices hash, total; ARGV: ttl, then product id, quantity, unit price in cents per line.
+LOAD_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then return 0 end
+local total = 0
+for i = 2, #ARGV, 3 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+    total = total + tonumber(ARGV[i + 1]) * tonumber(ARGV[i + 2])
+end
+redis.call('SET', KEYS[3], total)
+for i = 1, 3 do redis.call('EXPIRE', KEYS[i], ARGV[1]) end
+return 1
+"""
+
+
+class RedisCartBackend(BaseCartBackend):
+    """
+    Cart lines kept in Redis hashes, written to the database behind the request.
+
+    Each cart is a hash of product id to quantity, a hash of product id to
+    unit price in cents and a running total in cents. Every change is one
+    Lua call that adjusts the line and the total together, so totals are
+    maintained incrementally and never recomputed. Changed carts are added
+    to a dirty set that `persist_pending` drains in batches into the
+    `Cart`/`CartItem` tables; a cart that is not in Redis is loaded from
+    those tables on first use.
+    """
+    DIRTY_KEY = "store:cart:dirty"
+
+    def __init__(self, alias="default"):
+        from django_redis import get_redis_connection
+
+        self.redis = get_redis_connection(alias)
+        self.set_line_script = self.redis.register_script(SET_LINE_SCRIPT)
+        self.load_script = self.redis.register_script(LOAD_SCRIPT)
+
+    @property
+    def ttl(self):
+        return getattr(settings, "STORE_CART_TTL", 60 * 60 * 24 * 7)
+
+    @staticmethod
+    def keys(cart_id):
+        prefix = f"store:cart:{cart_id}"
+        return [f"{prefix}:items", f"{prefix}:prices", f"{prefix}:total"]
+
+    @staticmethod
+    def to_cents(amount):
+        return int((Decimal(amount) / CENTS).to_integral_value())
+
+    @staticmethod
+    def from_cents(cents):
+        return (Decimal(int(cents)) * CENTS).quantize(CENTS)
+
+    def load(self, cart):
+        """Copy the persisted lines of `cart` into Redis unless it is already there."""
+        keys = self.keys(cart.pk)
+        if self.redis.exists(keys[2]):
+            return
+        args = [self.ttl]
+        for product_id, quantity, price in CartItem.objects.filter(cart=cart).values_list(
+                "product_id", "quantity", "price"):
+            if quantity:
+                args += [product_id, quantity, self.to_cents(price / quantity)]
+        self.load_script(keys=keys, args=args)
+
+    def _read(self, cart_ids):
+        """Lines and total of every cart in `cart_ids`, read in one round trip."""
+        pipeline = self.redis.pipeline(transaction=False)
+        for cart_id in cart_ids:
+            items_key, prices_key, total_key = self.keys(cart_id)
+            pipeline.hgetall(items_key)
+            pipeline.hgetall(prices_key)
+            pipeline.get(total_key)
+        replies = pipeline.execute()
+
+        carts = {}
+        for index, cart_id in enumerate(cart_ids):
+            quantities, prices, total = replies[index * 3:index * 3 + 3]
+            lines = [
+                {"product": int(product_id), "quantity": int(quantity),
+                 "price": self.from_cents(int(quantity) * int(prices.get(product_id, 0)))}
+                for product_id, quantity in quantities.items()
+            ]
+            carts[cart_id] = (sorted(lines, key=lambda line: line["product"]),
+                              self.from_cents(total or 0), total is not None)
+        return carts
+
+    def items(self, cart):
+        self.load(cart)
+        return self._read([cart.pk])[cart.pk][0]
+
+    def total(self, cart):
+        self.load(cart)
+        return self.from_cents(self.redis.get(self.keys(cart.pk)[2]) or 0)
+
+    def _set_line(self, cart, product, quantity, mode):
+        self.load(cart)
+        unit_price = self.to_cents(product.effective_price)
+        quantity, _ = self.set_line_script(
+            keys=self.keys(cart.pk), args=[product.pk, quantity, unit_price, mode, self.ttl])
+        self.redis.sadd(self.DIRTY_KEY, cart.pk)
+        if not quantity:
+            return None
+        return {"product": product.pk, "quantity": int(quantity),
+                "price": self.from_cents(int(quantity) * unit_price)}
+
+    def add(self, cart, product, quantity):
+        return self._set_line(cart, product, quantity, "add")
+
+    def update(self, cart, product, quantity):
+        return self._set_line(cart, product, quantity, "set")
+
+    def remove(self, cart, product_id):
+        self.load(cart)
+        self.set_line_script(keys=self.keys(cart.pk), args=[product_id, 0, 0, "set", self.ttl])
+        self.redis.sadd(self.DIRTY_KEY, cart.pk)
+        return True
+
+    def clear(self, cart):
+        self.redis.delete(*self.keys(cart.pk))
+        self.redis.srem(self.DIRTY_KEY, cart.pk)
+        CartItem.objects.filter(cart=cart).delete()
+
+    def persist(self, cart):
+        self.redis.srem(self.DIRTY_KEY, cart.pk)
+        self.write([cart.pk])
+
+    def persist_pending(self, batch_size=500):
+        written = 0
+        while cart_ids := [int(cart_id) for cart_id in self.redis.spop(self.DIRTY_KEY, batch_size) or []]:
+            try:
+                written += self.write(cart_ids)
+            except Exception:
+                self.redis.sadd(self.DIRTY_KEY, *cart_ids)
+                raise
+        return written
+
+    def write(self, cart_ids):
+        """Replace the `CartItem` rows of the given carts with their Redis state in one transaction."""
+        existing = set(Cart.objects.filter(pk__in=cart_ids).values_list("pk", flat=True))
+        stale = [cart_id for cart_id in cart_ids if cart_id not in existing]
+        if stale:
+            self.redis.delete(*(key for cart_id in stale for key in self.keys(cart_id)))
+
+        carts = {cart_id: state for cart_id, state in self._read(list(existing)).items() if state[2]}
+        if not carts:
+            return 0
+
+        kept = Q()
+        for cart_id, (lines, _, _) in carts.items():
+            kept |= Q(cart_id=cart_id, product_id__in=[line["product"] for line in lines])
+        with transaction.atomic():
+            CartItem.objects.filter(cart_id__in=carts).exclude(kept).delete()
+            CartItem.objects.bulk_create(
+                [CartItem(cart_id=cart_id, product_id=line["product"],
+                          quantity=line["quantity"], price=line["price"])
+                 for cart_id, (lines, _, _) in carts.items() for line in lines],
+                update_conflicts=True, unique_fields=["cart", "product"],
+                update_fields=["quantity", "price"])
+            Cart.objects.filter(pk__in=carts).update(updated_at=Now())
+        logger.info(f"Persisted {len(carts)} carts from Redis")
+        return len(carts)
@@ -0,0 +1,19 @@
+from store.caches import ResponseCache, product_cache
+from store.models import Category
+
+
+def build_category_tree():
+    """Nest every category under its parent, reading the whole tree in path order with one query."""
+    nodes, roots = {}, []
+    categories = Category.objects.order_by("path").values(
+        "id", "name", "slug", "parent_id", "depth", "product_count")
+    for category in categories:
+        node = nodes[category["id"]] = {**category, "children": []}
+        parent = nodes.get(category["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+    return roots
+
+
+def category_tree():
+    """The navigation menu tree, served from the cache until a category or its counts change."""
+    return product_cache.get_or_set(ResponseCache.CATEGORY_TREE, build_category_tree)
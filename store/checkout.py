@@ -0,0 +1,69 @@
+from django.utils.translation import gettext_lazy as _
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Now
+from django.db import transaction
+
+from rest_framework.exceptions import ValidationError
+
+from store.models import Order, OrderItem, OutboxEvent, Product, StockReservation
+from store.reservations import InsufficientStock
+
+
+def checkout(cart, shipping_address, backend):
+    """
+    Convert `cart` into an `Order` in one transaction and a fixed number of
+    queries, whatever the number of lines.
+
+    The cart's products are locked in primary key order, so concurrent
+    checkouts of overlapping carts queue instead of deadlocking, and their
+    effective prices are snapshotted by the same SELECT. Stock the cart had
+    reserved counts towards its lines. Stock, `is_available`, the order
+    lines, the order total and the outbox events are each written by a
+    single statement.
+    """
+    lines = {line["product"]: line["quantity"] for line in backend.items(cart)}
+    if not lines:
+        raise ValidationError({"cart": _("The cart is empty.")})
+
+    with transaction.atomic():
+        products = {
+            pk: (price, stock) for pk, price, stock in
+            Product.objects.filter(pk__in=lines).order_by("pk").select_for_update()
+            .values_list("pk", "effective_price", "stock")
+        }
+        reservations = StockReservation.objects.filter(cart=cart, product__in=lines)
+        reserved = dict(reservations.order_by().values("product")
+                        .annotate(total=Sum("quantity")).values_list("product", "total"))
+
+        missing = [pk for pk, quantity in lines.items()
+                   if pk not in products or products[pk][1] + reserved.get(pk, 0) < quantity]
+        if missing:
+            raise InsufficientStock({"products": missing})
+
+        taken = {pk: quantity - reserved.get(pk, 0) for pk, quantity in lines.items()}
+        delta = Case(*(When(pk=pk, then=Value(quantity)) for pk, quantity in taken.items()),
+                     default=Value(0))
+        Product.objects.filter(pk__in=[pk for pk, quantity in taken.items() if quantity]).update(
+            stock=F("stock") - delta, is_available=Q(stock__gt=delta), updated_at=Now())
+        reservations.delete()
+
+        order = Order.objects.create(
+            user=cart.user, cart=cart, shipping_address=shipping_address)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=pk, quantity=quantity, price=products[pk][0] * quantity)
+            for pk, quantity in lines.items()
+        ])
+        total = (OrderItem.objects.filter(order=OuterRef("pk")).order_by()
+                 .values("order").annotate(total=Sum("price")).values("total"))
+        Order.objects.filter(pk=order.pk).update(order_total_price=Subquery(total))
+        order.refresh_from_db(fields=["order_total_price"])
+
+        OutboxEvent.objects.bulk_create([
+            OutboxEvent(topic=OutboxEvent.ORDER_CREATED, payload={
+                "order": order.pk, "user": order.user_id, "total": order.order_total_price}),
+            OutboxEvent(topic=OutboxEvent.STOCK_CHANGED, payload={"products": list(lines)}),
+        ])
+        # The backend may live outside the database, so the cart is only emptied once the order exists.
+        transaction.on_commit(lambda: backend.clear(cart))
+
+    return order
@@ -0,0 +1,41 @@
+from django.db import transaction
+
+from rest_framework.renderers import JSONRenderer
+
+from store.models import Product, ProductDocument
+from store.serializers import ProductSerializer
+from store.caches import product_cache
+
+
+def render_product_documents(product_ids):
+    """
+    Serialize the given products with `ProductSerializer` and upsert their
+    stored documents. Returns a mapping of product id to rendered body.
+
+    Documents are rendered without a request, so media and review links are
+    site-relative.
+    """
+    products = Product.objects.select_related("category").prefetch_related(
+        "color", "size", "images__renditions").filter(pk__in=product_ids)
+    renderer = JSONRenderer()
+    documents = [
+        ProductDocument(product=product, slug=product.slug,
+                        body=renderer.render(ProductSerializer(product).data).decode())
+        for product in products
+    ]
+    ProductDocument.objects.bulk_create(
+        documents, update_conflicts=True, unique_fields=["product"],
+        update_fields=["slug", "body", "updated_at"])
+
+    # Cached responses may hold the previous document; drop them now it is replaced.
+    product_cache.invalidate_products([document.slug for document in documents])
+    return {document.product_id: document.body for document in documents}
+
+
+def schedule_product_documents(product_ids):
+    """Queue a background rebuild of the given products' documents once the transaction commits."""
+    from store.tasks import rebuild_product_documents
+
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: rebuild_product_documents.delay(product_ids))
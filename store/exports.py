@@ -0,0 +1,77 @@
+import json
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
+
+from rest_framework.renderers import BaseRenderer
+
+
+# Flat projection of a product, read straight from the cursor with no model instances.
+EXPORT_FIELDS = {
+    "id": "id",
+    "slug": "slug",
+    "title": "title",
+    "description": "description",
+    "category": "category__name",
+    "unit_price": "unit_price",
+    "discount_price": "discount_price",
+    "effective_price": "effective_price",
+    "stock": "stock",
+    "is_available": "is_available",
+    "rating_average": "rating_average",
+    "rating_count": "rating_count",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+
+
+def export_chunk_size():
+    return getattr(settings, "STORE_EXPORT_CHUNK_SIZE", 2000)
+
+
+class Echo:
+    """File-like object whose `write` hands back the line instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder) + "\n"
+
+    def stream(self, rows):
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        writer = csv.writer(Echo())
+        rows = data.items() if isinstance(data, dict) else [[data]]
+        return "".join(writer.writerow(row) for row in rows)
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row[name] for name in EXPORT_FIELDS)
+
+
+def export_rows(queryset):
+    """Yield every product of `queryset` as a dict, reading through a server-side cursor."""
+    if not queryset.ordered:
+        queryset = queryset.order_by("pk")
+    names = list(EXPORT_FIELDS)
+    rows = queryset.values_list(*EXPORT_FIELDS.values()).iterator(chunk_size=export_chunk_size())
+    for values in rows:
+        yield dict(zip(names, values))
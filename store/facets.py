@@ -0,0 +1,118 @@
+from django.db.models import Count, F, Func, IntegerField, Max, Min, Value
+from django.db.models.functions import Least
+
+from django_filters import utils
+
+from store.filters import ProductFilter
+
+
+class ProductFacets:
+    """
+    Counts for every `ProductFilter` dimension plus a price histogram.
+
+    Facets are disjunctive: each dimension is counted over the products
+    matching every filter except its own, so the sidebar still offers the
+    sibling values of a selected option. Each facet is one GROUP BY query and
+    the histogram is a MIN/MAX aggregate followed by one `width_bucket`
+    GROUP BY, whatever the catalog size.
+    """
+    TERM_FACETS = {
+        "category": ("category", {"value": F("category__name")}),
+        "brand": ("brand", {"value": F("brand__slug"), "label": F("brand__title")}),
+        "color": ("color", {"value": F("color__value")}),
+        "size": ("size", {"value": F("size__value")}),
+    }
+    PRICE_FIELD = "effective_price"
+    PRICE_PARAMS = ("min_price", "max_price")
+    PRICE_BUCKETS = 10
+
+    def __init__(self, queryset, request, filterset_class=ProductFilter, buckets=None):
+        self.queryset = queryset
+        self.request = request
+        self.filterset_class = filterset_class
+        self.buckets = buckets or self.PRICE_BUCKETS
+
+    def filtered(self, *excluded_params):
+        """Apply the request's filters to the base queryset, ignoring `excluded_params`."""
+        data = self.request.query_params.copy()
+        for param in excluded_params:
+            data.pop(param, None)
+        filterset = self.filterset_class(data, queryset=self.queryset, request=self.request)
+        if not filterset.is_valid():
+            raise utils.translate_validation(filterset.errors)
+        return self.queryset.model.objects.filter(pk__in=filterset.qs.order_by().values("pk"))
+
+    def term_rows(self, param, fields):
+        return (self.filtered(param)
+                .values(**fields)
+                .annotate(count=Count("pk"))
+                .order_by("-count", "value"))
+
+    def term_counts(self, param, fields):
+        return [row for row in self.term_rows(param, fields) if row["value"] is not None]
+
+    async def aterm_counts(self, param, fields):
+        return [row async for row in self.term_rows(param, fields) if row["value"] is not None]
+
+    def price_bounds(self):
+        return {"min": Min(self.PRICE_FIELD), "max": Max(self.PRICE_FIELD), "total": Count("pk")}
+
+    def bucket_counts(self, queryset, low, high):
+        # width_bucket puts the maximum itself in bucket n + 1, fold it into the last one.
+        bucket = Least(
+            Func(F(self.PRICE_FIELD), Value(low), Value(high), Value(self.buckets),
+                 function="width_bucket", output_field=IntegerField()),
+            Value(self.buckets))
+        return (queryset.annotate(bucket=bucket)
+                .values("bucket")
+                .annotate(count=Count("pk"))
+                .values_list("bucket", "count"))
+
+    def histogram(self, bounds, counts):
+        low, high = bounds["min"], bounds["max"]
+        if low is None:
+            return {"min": None, "max": None, "buckets": []}
+        if low == high:
+            return {"min": low, "max": high,
+                    "buckets": [{"from": low, "to": high, "count": bounds["total"]}]}
+
+        width = (high - low) / self.buckets
+        return {
+            "min": low,
+            "max": high,
+            "buckets": [
+                {"from": low + width * index, "to": low + width * (index + 1),
+                 "count": counts.get(index + 1, 0)}
+                for index in range(self.buckets)
+            ],
+        }
+
+    def price_histogram(self):
+        queryset = self.filtered(*self.PRICE_PARAMS)
+        bounds = queryset.aggregate(**self.price_bounds())
+        counts = {}
+        if bounds["min"] is not None and bounds["min"] != bounds["max"]:
+            counts = dict(self.bucket_counts(queryset, bounds["min"], bounds["max"]))
+        return self.histogram(bounds, counts)
+
+    async def aprice_histogram(self):
+        queryset = self.filtered(*self.PRICE_PARAMS)
+        bounds = await queryset.aaggregate(**self.price_bounds())
+        counts = {}
+        if bounds["min"] is not None and bounds["min"] != bounds["max"]:
+            counts = {bucket: count async for bucket, count in
+                      self.bucket_counts(queryset, bounds["min"], bounds["max"])}
+        return self.histogram(bounds, counts)
+
+    def compute(self):
+        facets = {name: self.term_counts(param, fields)
+                  for name, (param, fields) in self.TERM_FACETS.items()}
+        facets["price"] = self.price_histogram()
+        return facets
+
+    async def acompute(self):
+        """`compute` through the async ORM."""
+        facets = {name: await self.aterm_counts(param, fields)
+                  for name, (param, fields) in self.TERM_FACETS.items()}
+        facets["price"] = await self.aprice_histogram()
+        return facets
@@ -1,20 +1,25 @@
 # your_app/filters.py
 import django_filters
-from store.models import Product
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from django.db.models.lookups import StartsWith
+from django.db.models import Exists, F, OuterRef, Q
+
+from store.search import search_products
+from store.models import Category, Product
 
 
 class ProductFilter(django_filters.FilterSet):
     promotion = django_filters.BooleanFilter(field_name='promotions__is_valid')
-    category = django_filters.CharFilter(
-        field_name='category__name', lookup_expr='exact')
+    category = django_filters.CharFilter(method='filter_category')
     color = django_filters.CharFilter(
         field_name='color__value', lookup_expr='icontains')
     size = django_filters.CharFilter(
         field_name='size__value', lookup_expr='icontains')
     min_price = django_filters.NumberFilter(
-        field_name='unit_price', lookup_expr='gte')
+        field_name='effective_price', lookup_expr='gte')
     max_price = django_filters.NumberFilter(
-        field_name='unit_price', lookup_expr='lte')
+        field_name='effective_price', lookup_expr='lte')
     title = django_filters.CharFilter(
         field_name='title', lookup_expr='icontains')
     brand = django_filters.CharFilter(
@@ -25,3 +30,51 @@ class ProductFilter(django_filters.FilterSet):
         model = Product
         fields = ['category', 'color', 'size', 'min_price',
                   'max_price', 'title', "is_available"]
+
+    def filter_category(self, queryset, name, value):
+        """
+        Products of the named category (by name or slug) and of every category below it.
+
+        The subtree is a subquery over the small category table, so building
+        the filter runs no query of its own and works unchanged in async views.
+        """
+        roots = (Category.objects.filter(Q(name=value) | Q(slug=value)).exclude(path="")
+                 .filter(StartsWith(OuterRef("path"), F("path"))))
+        return queryset.filter(category__in=Category.objects.filter(Exists(roots)))
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """Ranked full-text search over `Product.search_vector`, annotating `search_rank`."""
+    search_param = "search"
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search_products(queryset, terms)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.search_param,
+                "required": False,
+                "in": "query",
+                "description": "Full-text search over title, description, category and brand.",
+                "schema": {"type": "string"},
+            },
+        ]
+
+
+class ProductOrderingFilter(OrderingFilter):
+    """`OrderingFilter` that sorts `unit_price` requests on the price customers actually pay."""
+    aliases = {"unit_price": "effective_price"}
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return [("-" if field.startswith("-") else "") + self.aliases.get(field.lstrip("-"), field.lstrip("-"))
+                for field in ordering]
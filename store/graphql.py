@@ -1,7 +1,74 @@
 from graphene.types import Schema
 
+from graphql import ExecutionResult, FieldNode, FragmentDefinitionNode, InlineFragmentNode, OperationType
+
+from core.graphql_views import PersistedGraphQLView
+from core.mutations import AuthMutation
+from core import schemas as core_schemas
+
+from store.mutations import Mutation as StoreMutation
+from store.schemas import Query as StoreQuery
+from store.caches import graphql_cache
+
+
+class Query(StoreQuery, core_schemas.Query):
+    """Catalog queries, public, and account queries, scoped to the authenticated user or to staff."""
+
+
+class Mutation(StoreMutation, AuthMutation):
+    """Catalog mutations, which need an authenticated user, and the public JWT mutations."""
 
-from store.mutations import Mutation
-from store.schemas import Query
 
 schema = Schema(query=Query, mutation=Mutation)
+
+
+class StoreGraphQLView(PersistedGraphQLView):
+    """
+    Serves anonymous queries from `graphql_cache`, keyed on the normalized document and its variables.
+
+    Operations selecting a field of `UNCACHED_FIELDS` anywhere, fragments
+    included, always run: `_debug` reports the request's own SQL, and stock
+    moves through set-based updates on every reservation and checkout that
+    bump no cache version.
+    """
+    UNCACHED_FIELDS = {"_debug", "stock"}
+
+    def selects_uncached(self, document, selection_set, seen=frozenset()):
+        fragments = {definition.name.value: definition for definition in document.definitions
+                     if isinstance(definition, FragmentDefinitionNode)}
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if selection.name.value in self.UNCACHED_FIELDS:
+                    return True
+                nested = selection.selection_set
+            elif isinstance(selection, InlineFragmentNode):
+                nested = selection.selection_set
+            else:
+                name = selection.name.value
+                if name in seen or name not in fragments:
+                    continue
+                nested, seen = fragments[name].selection_set, seen | {name}
+            if nested is not None and self.selects_uncached(document, nested, seen):
+                return True
+        return False
+
+    def is_cacheable(self, request, document, operation_ast):
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return False
+        if "HTTP_AUTHORIZATION" in request.META or request.user.is_authenticated:
+            return False
+        return not self.selects_uncached(document, operation_ast.selection_set)
+
+    def execute_operation(self, request, prepared, operation_ast, variables, operation_name):
+        if not self.is_cacheable(request, prepared.document, operation_ast):
+            return super().execute_operation(request, prepared, operation_ast, variables, operation_name)
+
+        key = graphql_cache.make_key(prepared.digest, variables, operation_name)
+        data = graphql_cache.get(key)
+        if data is not None:
+            return ExecutionResult(data=data)
+
+        result = super().execute_operation(request, prepared, operation_ast, variables, operation_name)
+        if not result.errors:
+            graphql_cache.set(key, result.data)
+        return result
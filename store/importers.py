@@ -0,0 +1,199 @@
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import logging
+import json
+import csv
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.db import transaction
+
+from store.models import Brand, Category, Color, ColorValue, Product, Size, SizeValues
+from store.documents import schedule_product_documents
+from store.caches import product_cache
+
+
+logger = logging.getLogger("store")
+
+# Columns written when a row updates a product that already exists.
+PRODUCT_UPDATE_FIELDS = ["title", "description", "unit_price", "stock",
+                         "is_available", "category", "updated_at"]
+# Many-to-many columns and the name of their target column in the through table.
+PRODUCT_RELATIONS = {"brand": "brand_id", "color": "color_id", "size": "size_id"}
+# Multiple values of a CSV cell are separated by this character.
+CSV_LIST_SEPARATOR = "|"
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        for name in PRODUCT_RELATIONS:
+            if name in row:
+                value = row[name] or ""
+                row[name] = [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+        yield row
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class CatalogImporter:
+    """
+    Bulk loader for supplier product feeds.
+
+    Rows are keyed by their product slug and every batch is written with one
+    upserting `bulk_create`, so new products are inserted and known ones
+    rewritten in the same statement; brands, colors and sizes go straight
+    into the through tables. Category, brand, color and size references are
+    resolved through maps loaded once up front. Signals don't fire on bulk
+    writes, so the search vectors, discount prices and documents of each
+    batch are refreshed set-based, and category counts and caches once at
+    the end.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.created = self.updated = self.skipped = 0
+        self.load_references()
+
+    def load_references(self):
+        self.categories, self.brands, self.colors, self.sizes = {}, {}, {}, {}
+        for pk, name, slug in Category.objects.values_list("pk", "name", "slug"):
+            self.categories.setdefault(name, pk)
+            self.categories.setdefault(slug, pk)
+        for pk, title, slug in Brand.objects.values_list("pk", "title", "slug"):
+            self.brands.setdefault(title, pk)
+            self.brands.setdefault(slug, pk)
+        for pk, value in Color.objects.values_list("pk", "value"):
+            self.colors.setdefault(value, pk)
+        for pk, value in Size.objects.values_list("pk", "value"):
+            self.sizes.setdefault(value, pk)
+
+    def resolve_category(self, name):
+        if not name:
+            return None
+        if name not in self.categories:
+            category = Category(name=name, description="")
+            category.save()
+            self.categories[name] = self.categories[category.slug] = category.pk
+        return self.categories[name]
+
+    def resolve_brands(self, titles):
+        for title in titles:
+            if title not in self.brands:
+                brand = Brand.objects.create(title=title)
+                self.brands[title] = self.brands[brand.slug] = brand.pk
+        return [self.brands[title] for title in titles]
+
+    @staticmethod
+    def resolve_choices(values, references, model, choices):
+        pks = []
+        for value in values:
+            value = value.upper()
+            if value not in references:
+                if value not in choices.values:
+                    raise ValueError(f"unknown {model._meta.model_name} {value!r}")
+                references[value] = model.objects.create(value=value).pk
+            pks.append(references[value])
+        return pks
+
+    def parse_row(self, row):
+        """
+        Build an unsaved `Product` and its many-to-many ids from one input row.
+        Only the relations the row has a column or key for are returned, so a
+        feed without, say, sizes leaves the sizes of existing products alone.
+        """
+        title = (row.get("title") or "").strip()
+        if not title:
+            raise ValueError("missing title")
+        unit_price = Decimal(str(row["unit_price"]))
+        stock = int(row.get("stock") or 0)
+        for name, value in (("unit_price", unit_price), ("stock", stock)):
+            Product._meta.get_field(name).run_validators(value)
+
+        product = Product(
+            title=title, slug=Product.make_slug(title),
+            description=row.get("description") or "",
+            unit_price=unit_price, stock=stock, is_available=stock > 0,
+            category_id=self.resolve_category((row.get("category") or "").strip()))
+        resolvers = {
+            "brand": self.resolve_brands,
+            "color": lambda values: self.resolve_choices(values, self.colors, Color, ColorValue),
+            "size": lambda values: self.resolve_choices(values, self.sizes, Size, SizeValues),
+        }
+        relations = {name: resolve(row[name] or []) for name, resolve in resolvers.items() if name in row}
+        return product, relations
+
+    def import_batch(self, rows, first_line=1):
+        """Write one batch of rows in a single transaction. Returns the number of rows written."""
+        products = {}
+        for line, row in enumerate(rows, start=first_line):
+            try:
+                product, relations = self.parse_row(row)
+            except (KeyError, TypeError, ValueError, InvalidOperation, ValidationError) as error:
+                self.skipped += 1
+                logger.warning(f"Skipping catalog row {line}: {error!r}")
+                continue
+            # A later row for the same slug wins.
+            products[product.slug] = (product, relations)
+        if not products:
+            return 0
+
+        with transaction.atomic():
+            existing = set(Product.objects.filter(slug__in=products).values_list("pk", flat=True))
+            now = timezone.now()
+            for product, _ in products.values():
+                product.updated_at = now
+
+            # One INSERT ... ON CONFLICT (slug) DO UPDATE, which also returns the pk of every row.
+            Product.objects.bulk_create(
+                [product for product, _ in products.values()],
+                update_conflicts=True, unique_fields=["slug"], update_fields=PRODUCT_UPDATE_FIELDS)
+
+            for name, column in PRODUCT_RELATIONS.items():
+                listed = [(product, relations[name]) for product, relations in products.values()
+                          if name in relations]
+                if not listed:
+                    continue
+                through = getattr(Product, name).through
+                through.objects.filter(product_id__in=[product.pk for product, _ in listed]).delete()
+                through.objects.bulk_create(
+                    [through(product_id=product.pk, **{column: pk}) for product, pks in listed for pk in pks],
+                    ignore_conflicts=True)
+
+            product_ids = [product.pk for product, _ in products.values()]
+            batch = Product.objects.filter(pk__in=product_ids)
+            batch.update_search_vector()
+            batch.recompute_discount_prices()
+            schedule_product_documents(product_ids)
+
+        self.created += len(products) - len(existing)
+        self.updated += len(existing)
+        return len(products)
+
+    def run(self, rows, progress=None):
+        """Import every row of the iterable, calling `progress(importer)` after each batch."""
+        line = 1
+        for batch in batched(rows, self.batch_size):
+            self.import_batch(batch, first_line=line)
+            line += len(batch)
+            if progress:
+                progress(self)
+        self.finish()
+
+    def finish(self):
+        with transaction.atomic():
+            Category.objects.rebuild_product_counts()
+            product_cache.invalidate_products()
+            product_cache.invalidate_categories()
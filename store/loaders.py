@@ -0,0 +1,22 @@
+from core.loaders import Loaders, ModelLoader, RelatedLoader
+
+from store.models import Category, Product, ProductImage
+
+
+@Loaders.register
+class ProductCategoryLoader(ModelLoader):
+    queryset = Category.objects.all()
+    parent, parent_key = Product, "category_id"
+
+
+@Loaders.register
+class ImageProductLoader(ModelLoader):
+    queryset = Product.objects.all()
+    parent, parent_key = ProductImage, "product_id"
+
+
+@Loaders.register
+class ProductImagesLoader(RelatedLoader):
+    queryset = ProductImage.objects.order_by("pk")
+    field = "product"
+    parent, parent_key = Product, "pk"
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.caches import graphql_cache
+
+
+class Command(BaseCommand):
+    help = "Show the hit and miss counts of the GraphQL result cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counts after showing them")
+
+    def handle(self, *args, **options):
+        stats = graphql_cache.stats()
+        ratio = f"{stats['hit_ratio']:.1%}" if stats["hit_ratio"] is not None else "n/a"
+        self.stdout.write(f"hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio}")
+        if options["reset"]:
+            graphql_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("GraphQL cache counts reset"))
@@ -0,0 +1,48 @@
+from pathlib import Path
+import time
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.importers import READERS, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = "Stream products from a CSV or JSON Lines feed into the catalog with bulk inserts and updates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file to import, '-' reads standard input")
+        parser.add_argument("--format", choices=sorted(READERS),
+                            help="Input format, guessed from the file extension by default")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Number of rows written per transaction")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or Path(path).suffix.lstrip(".").lower()
+        if file_format not in READERS:
+            raise CommandError("Cannot guess the input format, pass --format csv or --format jsonl")
+
+        started = time.monotonic()
+
+        def progress(importer):
+            total = importer.created + importer.updated + importer.skipped
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"{total} rows processed, {total / elapsed:.0f} rows/s")
+
+        importer = CatalogImporter(batch_size=options["batch_size"])
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            importer.run(READERS[file_format](stream),
+                         progress=progress if options["verbosity"] > 1 else None)
+        except OSError as error:
+            raise CommandError(error)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        total = importer.created + importer.updated
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {total} products ({importer.created} created, {importer.updated} updated, "
+            f"{importer.skipped} skipped) in {elapsed:.1f}s, {total / elapsed:.0f} products/s"))
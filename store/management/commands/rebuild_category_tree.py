@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from store.caches import product_cache
+from store.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized paths, depths and subtree product counts of every category"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            paths, pending = {None: ""}, list(Category.objects.values_list("pk", "parent_id"))
+            while pending:
+                remaining = [(pk, parent_id) for pk, parent_id in pending if parent_id not in paths]
+                if len(remaining) == len(pending):
+                    raise ValueError(f"Categories {[pk for pk, _ in remaining]} form a cycle")
+                for pk, parent_id in pending:
+                    if parent_id in paths:
+                        paths[pk] = f"{paths[parent_id]}{pk:0{Category.PATH_STEP}d}{Category.PATH_SEPARATOR}"
+                pending = remaining
+
+            categories = [Category(pk=pk, path=path, depth=len(path) // Category.PATH_SEGMENT_LENGTH - 1)
+                          for pk, path in paths.items() if pk is not None]
+            Category.objects.bulk_update(categories, ["path", "depth"], batch_size=1000)
+            Category.objects.rebuild_product_counts()
+            product_cache.invalidate_categories()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the category tree for {len(categories)} categories"))
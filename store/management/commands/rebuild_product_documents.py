@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from store.documents import render_product_documents
+from store.tasks import rebuild_product_documents
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Regenerate the stored detail document of every product, e.g. after a deploy or schema change"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Number of products rendered per batch")
+        parser.add_argument("--async", action="store_true", dest="use_celery",
+                            help="Queue one Celery task per batch instead of rendering in this process")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        product_ids = Product.objects.order_by("pk").values_list("pk", flat=True)
+        batch, total = [], 0
+
+        for product_id in product_ids.iterator(chunk_size=batch_size):
+            batch.append(product_id)
+            if len(batch) == batch_size:
+                total += self.rebuild(batch, options["use_celery"])
+                batch = []
+        if batch:
+            total += self.rebuild(batch, options["use_celery"])
+
+        action = "Queued" if options["use_celery"] else "Rebuilt"
+        self.stdout.write(self.style.SUCCESS(f"{action} {total} product documents"))
+
+    def rebuild(self, product_ids, use_celery):
+        if use_celery:
+            rebuild_product_documents.delay(product_ids)
+            return len(product_ids)
+        return len(render_product_documents(product_ids))
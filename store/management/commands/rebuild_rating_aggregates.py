@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.db import transaction
+
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized review aggregates of every product from the reviews table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Number of product ids updated per transaction")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = Product.objects.aggregate(last=Max("pk"))["last"] or 0
+        updated = 0
+
+        for start in range(0, last_id + 1, batch_size):
+            with transaction.atomic():
+                updated += Product.objects.filter(
+                    pk__gte=start, pk__lt=start + batch_size).rebuild_rating_aggregates()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rating aggregates for {updated} products"))
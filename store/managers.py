@@ -0,0 +1,140 @@
+from django.db.models.functions import Cast, Coalesce, Concat, Now, Round, Substr
+from django.db.models import (Avg, Case, Count, DecimalField, Exists, F, Func, IntegerField,
+                              OuterRef, Q, Subquery, Sum, Value, When)
+from django.utils import timezone
+from django.db import models
+
+
+RATING_STARS = range(1, 6)
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def update_search_vector(self):
+        """Rebuild the full-text document of every product in the queryset with one UPDATE."""
+        from store.search import product_search_vector
+
+        return self.update(search_vector=product_search_vector())
+
+    def apply_rating(self, rating, delta=1):
+        """
+        Add (delta=1) or remove (delta=-1) a single rating from the stored
+        review aggregates. Every column is computed from its current value
+        inside the UPDATE, so concurrent reviews never overwrite each other.
+        """
+        count = F("rating_count") + delta
+        total = F("rating_sum") + rating * delta
+        updates = {
+            "rating_count": count,
+            "rating_sum": total,
+            "updated_at": Now(),
+            "rating_average": Case(
+                When(rating_count__lte=-delta, then=Value(0)),
+                default=Cast(total, DecimalField(max_digits=12, decimal_places=2)) / count,
+                output_field=DecimalField(max_digits=3, decimal_places=2)),
+        }
+        if rating in RATING_STARS:
+            updates[f"rating_{rating}_count"] = F(f"rating_{rating}_count") + delta
+        return self.update(**updates)
+
+    def rebuild_rating_aggregates(self):
+        """Recompute the review aggregates of every product in the queryset from `store_review`."""
+        from store.models import Review
+
+        reviews = Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+
+        def aggregate(expression):
+            return Coalesce(Subquery(reviews.annotate(value=expression).values("value")), Value(0))
+
+        updates = {
+            "rating_count": aggregate(Count("pk")),
+            "rating_sum": aggregate(Sum("rating")),
+            "rating_average": aggregate(
+                Cast(Avg("rating"), DecimalField(max_digits=3, decimal_places=2))),
+        }
+        for star in RATING_STARS:
+            updates[f"rating_{star}_count"] = aggregate(Count("pk", filter=Q(rating=star)))
+        return self.update(**updates, updated_at=Now())
+
+    def reserve_stock(self, quantity):
+        """
+        Take `quantity` units from every product in the queryset that still
+        has them, as one conditional UPDATE. `is_available` is derived from
+        the pre-update stock in the same statement. Returns the number of
+        products whose stock was taken.
+        """
+        return self.filter(stock__gte=quantity).update(
+            stock=F("stock") - quantity,
+            is_available=Q(stock__gt=quantity),
+            updated_at=Now())
+
+    def release_stock(self, quantity):
+        """Put `quantity` units (a number or an expression) back into stock."""
+        if not hasattr(quantity, "resolve_expression"):
+            # A literal would let Django fold `stock > -quantity` away on the unsigned column.
+            quantity = Value(quantity)
+        return self.update(
+            stock=F("stock") + quantity, is_available=Q(stock__gt=-quantity), updated_at=Now())
+
+    def recompute_discount_prices(self, now=None):
+        """
+        Set `discount_price` from the most recently started discount that is
+        valid at `now`, or clear it, for every product in the queryset.
+        Runs two set-based UPDATEs and only touches rows whose price changes;
+        their detail documents, which show the effective price, are rebuilt.
+        """
+        from store.documents import schedule_product_documents
+        from store.models import Discount
+
+        now = now or timezone.now()
+        active = Discount.objects.filter(
+            product=OuterRef("pk"), start_date__lte=now, end_date__gte=now).order_by("-start_date")
+        percentage = Subquery(active.values("discount_percentage")[:1])
+        price = Round(F("unit_price") * (100 - percentage) / 100, 2,
+                      output_field=DecimalField(max_digits=20, decimal_places=2))
+
+        discounted = list(self.filter(Exists(active))
+                          .annotate(new_discount_price=price)
+                          .exclude(discount_price=F("new_discount_price"))
+                          .values_list("pk", flat=True))
+        cleared = list(self.filter(discount_price__isnull=False)
+                       .exclude(Exists(active))
+                       .values_list("pk", flat=True))
+        self.filter(pk__in=discounted).update(discount_price=price, updated_at=Now())
+        self.filter(pk__in=cleared).update(discount_price=None, updated_at=Now())
+        schedule_product_documents(discounted + cleared)
+        return len(discounted) + len(cleared)
+
+
+class CategoryQuerySet(models.QuerySet):
+
+    def subtree(self, path):
+        """The node stored at `path` and all of its descendants, as one indexed prefix scan."""
+        return self.filter(path__startswith=path)
+
+    def ancestors(self, path):
+        """The node stored at `path` and every category above it."""
+        return self.filter(path__in=self.model.ancestor_paths(path))
+
+    def adjust_product_count(self, category_id, delta):
+        """Add `delta` products to a category and every one of its ancestors in one UPDATE."""
+        path = self.filter(pk=category_id).values_list("path", flat=True).first()
+        if not path or not delta:
+            return 0
+        return self.ancestors(path).update(product_count=F("product_count") + delta)
+
+    def move_subtree(self, old_path, new_path):
+        """Rewrite the path and depth of every node under `old_path` to hang under `new_path`."""
+        shift = (len(new_path) - len(old_path)) // self.model.PATH_SEGMENT_LENGTH
+        return self.subtree(old_path).update(
+            path=Concat(Value(new_path), Substr("path", len(old_path) + 1)),
+            depth=F("depth") + shift)
+
+    def rebuild_product_counts(self):
+        """Recount the products under every category in the queryset from `store_product`."""
+        from store.models import Product
+
+        products = Product.objects.filter(category__path__startswith=OuterRef("path")).order_by()
+        count = products.annotate(
+            count=Func("pk", function="COUNT", output_field=IntegerField())).values("count")
+        return self.update(product_count=Coalesce(Subquery(count), Value(0)))
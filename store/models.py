@@ -2,13 +2,21 @@ from uuid import uuid4
 
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth import get_user_model
+from django.db.models.functions import Coalesce
 from django.utils.text import slugify
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 
-from store.validators import PRODUCT_PRICE_VALIDATORS, STOCK_QUANTITY_VALIDATORS
+from store.validators import PRODUCT_PRICE_VALIDATORS, STOCK_QUANTITY_VALIDATORS, REVIEW_RATING_VALIDATORS
+from store.managers import CategoryQuerySet, ProductQuerySet
 from store.utility import Utility
+from store.caches import product_cache
 
 User = get_user_model()
 utility = Utility()
@@ -72,6 +80,7 @@ class ProductImage(models.Model):
         'Product', on_delete=models.CASCADE, related_name='images', verbose_name=_("Product"))
     image = models.ImageField(upload_to='products/', verbose_name=_("Image"))
     alt_text = models.CharField(max_length=255, verbose_name=_("Alt Text"))
+    renditions = GenericRelation("ImageRendition")
 
     def __str__(self):
         return f"{self.product.title}"
@@ -94,6 +103,7 @@ class RevewImage(models.Model):
         "Review"), related_name="images", null=True, blank=True)
     image = models.ImageField(upload_to='products/', verbose_name=_("Image"))
     alt_text = models.CharField(max_length=255, verbose_name=_("Alt Text"))
+    renditions = GenericRelation("ImageRendition")
 
     def __str__(self):
         return f"{self.product.title}"
@@ -110,6 +120,39 @@ class RevewImage(models.Model):
                    models.Index(fields=['review'])]
 
 
+class ImageRendition(models.Model):
+    """A resized, re-encoded copy of an uploaded image, generated in the background."""
+    WEBP_FORMAT = 'webp'
+    JPEG_FORMAT = 'jpeg'
+
+    FORMAT_CHOICES = [
+        (WEBP_FORMAT, _("WebP")),
+        (JPEG_FORMAT, _("JPEG")),
+    ]
+
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, verbose_name=_("Content Type"))
+    object_id = models.PositiveBigIntegerField(verbose_name=_("Object ID"))
+    source = GenericForeignKey("content_type", "object_id")
+    source_name = models.CharField(
+        max_length=255, verbose_name=_("Source File"))
+    name = models.CharField(max_length=20, verbose_name=_("Name"))
+    format = models.CharField(
+        max_length=10, choices=FORMAT_CHOICES, verbose_name=_("Format"))
+    width = models.PositiveIntegerField(verbose_name=_("Width"))
+    height = models.PositiveIntegerField(verbose_name=_("Height"))
+    image = models.ImageField(
+        upload_to='renditions/', verbose_name=_("Image"))
+
+    def __str__(self):
+        return f"{self.source_name} - {self.name}.{self.format}"
+
+    class Meta:
+        verbose_name = _("Image Rendition")
+        verbose_name_plural = _("Image Renditions")
+        indexes = [models.Index(fields=['content_type', 'object_id'])]
+
+
 class Discount(models.Model):
     product = models.ManyToManyField("Product",
                                      related_name="discount", verbose_name=_("Product"))
@@ -130,10 +173,13 @@ class Discount(models.Model):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        [product.calculate_discount() for product in self.product.all()]
+        if self.pk:
+            Product.objects.filter(discount=self).recompute_discount_prices()
 
     class Meta:
         ordering = ["-end_date"]
+        indexes = [models.Index(fields=['start_date']),
+                   models.Index(fields=['end_date'])]
         verbose_name = _("Promotion")
         verbose_name_plural = _("Promotions")
 
@@ -143,6 +189,7 @@ class Brand(models.Model):
     slug = models.SlugField(_("Slug"), unique=True, blank=True, db_index=True)
     logo = models.ImageField(
         _("Logo"), upload_to="logos/", null=True, blank=True)
+    renditions = GenericRelation("ImageRendition")
     description = models.TextField(_("Description"), blank=True)
     created_at = models.DateTimeField(
         auto_now_add=True, verbose_name=_("Created At"))
@@ -171,6 +218,10 @@ class Product(models.Model):
         max_digits=20, decimal_places=2, verbose_name=_("Price"), validators=PRODUCT_PRICE_VALIDATORS)
     discount_price = models.DecimalField(
         max_digits=20, decimal_places=2, verbose_name=_("Discount Price"), blank=True, null=True)
+    effective_price = models.GeneratedField(
+        expression=Coalesce("discount_price", "unit_price"),
+        output_field=models.DecimalField(max_digits=20, decimal_places=2),
+        db_persist=True, verbose_name=_("Effective Price"))
     category = models.ForeignKey(
         "Category", on_delete=models.SET_NULL, blank=True, null=True, verbose_name=_("Category"))
     color = models.ManyToManyField(
@@ -182,10 +233,31 @@ class Product(models.Model):
     is_available = models.BooleanField(_("Is Available"), default=True)
     thumbnail = models.ImageField(verbose_name=_(
         "Thumbnail"), upload_to="thumbnails/", null=True, blank=True)
+    renditions = GenericRelation("ImageRendition")
     created_at = models.DateTimeField(
         auto_now_add=True, verbose_name=_("Created At"))
     updated_at = models.DateTimeField(
         auto_now=True, verbose_name=_("Updated At"))
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name=_("Search Vector"))
+    rating_average = models.DecimalField(
+        max_digits=3, decimal_places=2, default=0, editable=False, verbose_name=_("Average Rating"))
+    rating_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("Rating Count"))
+    rating_sum = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("Rating Sum"))
+    rating_1_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("1 Star Ratings"))
+    rating_2_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("2 Star Ratings"))
+    rating_3_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("3 Star Ratings"))
+    rating_4_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("4 Star Ratings"))
+    rating_5_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("5 Star Ratings"))
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.title}"
@@ -193,30 +265,19 @@ class Product(models.Model):
     def has_enough_stock(self, quantity):
         return self.stock >= quantity
 
-    def reduce_stock(self, quantity):
-        if self.has_enough_stock(quantity):
-            self.stock -= quantity
-            self.save()
-            return True
-        return False
-
     def calculate_discount(self):
         """
         Calculate the discount price based on the most recent valid promotion.
         Updates discount_price if a valid promotion exists, otherwise sets it to None.
         """
-        valid_promotion = self.promotions.filter(
-            start_date__lte=timezone.now(),
-            end_date__gte=timezone.now()
-            # Get the most recent valid promotion
-        ).order_by('-start_date').first()
-
-        if valid_promotion:
-            discount_percentage = valid_promotion.discount_percentage
-            self.discount_price = self.unit_price * (1 - discount_percentage)
-        else:
-            self.discount_price = None
-        self.save(update_fields=['discount_price'])
+        if Product.objects.filter(pk=self.pk).recompute_discount_prices():
+            product_cache.invalidate_products([self.slug])
+        self.refresh_from_db(fields=['discount_price', 'updated_at'])
+
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star, read from the stored aggregate columns."""
+        return {star: getattr(self, f"rating_{star}_count") for star in range(1, 6)}
 
     @property
     def current_price(self):
@@ -226,9 +287,13 @@ class Product(models.Model):
     def check_avaliablity(self):
         return self.stock > 0
 
+    @classmethod
+    def make_slug(cls, title):
+        return utility.persian_slugify(None, title)[:cls._meta.get_field("slug").max_length]
+
     def save(self, *args, **kwargs):
         self.is_available = self.check_avaliablity()
-        self.slug = utility.persian_slugify(self.title)
+        self.slug = self.make_slug(self.title)
         super().save(*args, **kwargs)
 
     class Meta:
@@ -236,27 +301,125 @@ class Product(models.Model):
         verbose_name_plural = _("Products")
         indexes = [
             models.Index(fields=['slug']),
-            models.Index(fields=['created_at']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['unit_price', 'id']),
+            models.Index(fields=['effective_price', 'id']),
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['rating_average', 'id']),
             models.Index(fields=['updated_at']),
+            GinIndex(fields=['search_vector']),
         ]
 
 
+class StockReservation(models.Model):
+    """Units of a product held out of stock for a cart during checkout, until `expires_at`."""
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations", verbose_name=_("Product"))
+    cart = models.ForeignKey(
+        "Cart", on_delete=models.CASCADE, related_name="reservations", null=True, blank=True, verbose_name=_("Cart"))
+    quantity = models.PositiveIntegerField(verbose_name=_("Quantity"))
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name=_("Created At"))
+    expires_at = models.DateTimeField(verbose_name=_("Expires At"), db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}"
+
+    class Meta:
+        verbose_name = _("Stock Reservation")
+        verbose_name_plural = _("Stock Reservations")
+
+
+class ProductDocument(models.Model):
+    """Pre-rendered product detail response, rebuilt in the background whenever the product changes."""
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="document", verbose_name=_("Product"))
+    slug = models.SlugField(verbose_name=_("Slug"), db_index=True)
+    body = models.TextField(verbose_name=_("Body"))
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name=_("Updated At"))
+
+    def __str__(self):
+        return f"{self.slug}"
+
+    class Meta:
+        verbose_name = _("Product Document")
+        verbose_name_plural = _("Product Documents")
+
+
 class Category(models.Model):
+    """
+    A node of the category tree.
+
+    `path` is the materialized path of the node, one fixed-width segment per
+    ancestor (``"0000001/0000004/"``), so a whole subtree is a single indexed
+    prefix match. `product_count` counts the products of the node and all of
+    its descendants and is kept up to date incrementally.
+    """
+    PATH_STEP = 7
+    PATH_SEPARATOR = "/"
+    PATH_SEGMENT_LENGTH = PATH_STEP + len(PATH_SEPARATOR)
+
     name = models.CharField(max_length=255, verbose_name=_("Name"))
     slug = models.SlugField(verbose_name=_("Slug"), max_length=300)
     description = models.CharField(
         max_length=2083, verbose_name=_("Description"))
+    parent = models.ForeignKey(
+        "self", on_delete=models.PROTECT, blank=True, null=True, related_name="children", verbose_name=_("Parent"))
+    path = models.CharField(max_length=255, default="", editable=False, verbose_name=_("Path"))
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name=_("Depth"))
+    product_count = models.PositiveIntegerField(default=0, editable=False, verbose_name=_("Product Count"))
+
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def ancestor_paths(cls, path):
+        """Every prefix of `path` that is the path of a node, from the root down to `path` itself."""
+        return [path[:end] for end in range(cls.PATH_SEGMENT_LENGTH, len(path) + 1, cls.PATH_SEGMENT_LENGTH)]
+
+    def build_path(self):
+        parent_path = ""
+        if self.parent_id:
+            parent_path = Category.objects.values_list("path", flat=True).get(pk=self.parent_id)
+        return f"{parent_path}{self.pk:0{self.PATH_STEP}d}{self.PATH_SEPARATOR}"
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id and (self.parent_id == self.pk or self.parent.path.startswith(self.path)):
+            raise ValidationError({"parent": _("A category cannot be moved under itself or its descendants.")})
+
     def save(self, *args, **kwargs):
         self.slug = utility.persian_slugify("cat", self.name)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            path = self.build_path()
+            if path != self.path:
+                self.move_to(path)
+
+    def move_to(self, path):
+        """Re-root this node's subtree at `path`, carrying its product count to the new ancestors."""
+        old_path = self.path
+        if old_path:
+            count = Category.objects.values_list("product_count", flat=True).get(pk=self.pk)
+            Category.objects.ancestors(old_path).exclude(pk=self.pk).update(
+                product_count=models.F("product_count") - count)
+            Category.objects.move_subtree(old_path, path)
+            Category.objects.ancestors(path).exclude(pk=self.pk).update(
+                product_count=models.F("product_count") + count)
+        else:
+            Category.objects.filter(pk=self.pk).update(
+                path=path, depth=len(path) // self.PATH_SEGMENT_LENGTH - 1)
+        self.refresh_from_db(fields=["path", "depth", "product_count"])
 
     class Meta:
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
+        indexes = [
+            models.Index(fields=["path"], name="store_category_path_idx", opclasses=["varchar_pattern_ops"]),
+        ]
 
 
 class SizeValues(models.TextChoices):
@@ -335,13 +498,13 @@ class Cart(models.Model):
         """
         Recalculate the total price based on all cart items.
         """
-        return sum(item.unit_price * item.quantity for item in self.items.all())
+        return self.items.aggregate(total=models.Sum("price"))["total"] or 0
 
     def save(self, *args, **kwargs):
         """Override save to assign label based on creation order."""
         if not self.pk:
             existing_carts = Cart.objects.filter(
-                user=self.user).order_by('created_at')
+                user=self.user, order__isnull=True).order_by('created_at')
             current_count = existing_carts.count()
 
             if current_count >= 2:
@@ -383,13 +546,15 @@ class CartItem(models.Model):
         """
         Automatically update the item price before saving.
         """
-        self.price = self.product.unit_price * self.quantity
+        self.price = self.product.effective_price * self.quantity
         super().save(*args, **kwargs)
-        self.cart.calculate_total_price()
 
     class Meta:
         verbose_name = _("Cart Item")
         verbose_name_plural = _("Cart Items")
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "product"], name="unique_cart_product"),
+        ]
 
 
 class Order(models.Model):
@@ -436,25 +601,17 @@ class Order(models.Model):
         auto_now=True, verbose_name=_("Updated At"))
 
     def __str__(self):
-        return f"{self.cart.user.phone_number} - {self.created_at.strftime('%Y-%m-%d')}"
-
-    def save(self, *args, **kwargs):
-        print(self.cart.items)
-        if self.pk:
-            total_price = sum(item.price for item in self.items.all())
-
-            if self.order_total_price != total_price:
-                self.order_total_price = total_price
-
-        super().save(*args, **kwargs)
+        return f"{self.user.phone_number} - {self.created_at.strftime('%Y-%m-%d')}"
 
     @property
     def total_price(self):
-        return sum(item.price for item in self.items.all())
+        """The total stored at checkout."""
+        return self.order_total_price
 
     class Meta:
         verbose_name = _("Order")
         verbose_name_plural = _("Orders")
+        indexes = [models.Index(fields=['user', 'created_at', 'id'])]
 
 
 class OrderItem(models.Model):
@@ -472,7 +629,7 @@ class OrderItem(models.Model):
         "Price"), max_digits=20, decimal_places=2)
 
     def __str__(self):
-        return f"{self.product.title} - {self.order.cart.user.phone_number}"
+        return f"{self.product.title} - {self.order.user.phone_number}"
 
     def save(self, *args, **kwargs):
         self.price = self.product.unit_price * self.quantity
@@ -516,6 +673,14 @@ class Payment(models.Model):
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.amount}"
 
+    def save(self, *args, **kwargs):
+        """Save and record a `payment.saved` event in the same transaction."""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            OutboxEvent.publish(OutboxEvent.PAYMENT_SAVED, {
+                "transaction_id": self.transaction_id, "order": self.order_id,
+                "user": self.user_id, "status": self.status, "amount": self.amount})
+
     class Meta:
         verbose_name = _("Payment")
         verbose_name_plural = _("Payments")
@@ -527,11 +692,13 @@ class Review(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="reviews", verbose_name=_("Product"))
     rating = models.PositiveIntegerField(
-        default=1, verbose_name=_("Rating"))
+        default=1, verbose_name=_("Rating"), validators=REVIEW_RATING_VALIDATORS)
     comment = models.TextField(
         blank=True, null=True, verbose_name=_("Comment"))
     created_at = models.DateTimeField(
         auto_now_add=True, verbose_name=_("Created At"))
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name=_("Updated At"))
 
     def __str__(self):
         return f"{self.user.phone_number} - {self.rating} stars"
@@ -539,6 +706,7 @@ class Review(models.Model):
     class Meta:
         verbose_name = _("Review")
         verbose_name_plural = _("Reviews")
+        indexes = [models.Index(fields=['product', 'created_at', 'id'])]
 
 
 class Wishlist(models.Model):
@@ -555,3 +723,40 @@ class Wishlist(models.Model):
     class Meta:
         verbose_name = _("Wishlist")
         verbose_name_plural = _("Wishlists")
+
+
+class OutboxEvent(models.Model):
+    """
+    A domain event recorded in the same transaction as the change it
+    describes, and handed to its handlers by the outbox drain task once
+    committed.
+    """
+    ORDER_CREATED = "order.created"
+    PAYMENT_SAVED = "payment.saved"
+    STOCK_CHANGED = "product.stock_changed"
+
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=100, verbose_name=_("Topic"))
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name=_("Payload"))
+    created_at = models.DateTimeField(
+        auto_now_add=True, verbose_name=_("Created At"))
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Processed At"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("Attempts"))
+    last_error = models.TextField(blank=True, verbose_name=_("Last Error"))
+    leased_until = models.DateTimeField(null=True, blank=True, verbose_name=_("Leased Until"))
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk}"
+
+    @classmethod
+    def publish(cls, topic, payload):
+        """Record an event; call inside the transaction that makes the change."""
+        return cls.objects.create(topic=topic, payload=payload)
+
+    class Meta:
+        verbose_name = _("Outbox Event")
+        verbose_name_plural = _("Outbox Events")
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(processed_at__isnull=True),
+                         name="store_outbox_pending_idx"),
+        ]
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from datetime import timedelta
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db.models.functions import Now
+from django.db.models import F, Q
+from django.utils import timezone
+from django.db import transaction
+from django.conf import settings
+
+from store.models import OutboxEvent
+from store.documents import render_product_documents
+from core.utils import CoreUtils
+
+
+logger = logging.getLogger("store")
+
+User = get_user_model()
+
+HANDLERS = defaultdict(list)
+
+
+def handles(topic):
+    """Register the decorated function as a handler of `topic` events, called with the payload."""
+    def register(handler):
+        HANDLERS[topic].append(handler)
+        return handler
+    return register
+
+
+def max_attempts():
+    return getattr(settings, "STORE_OUTBOX_MAX_ATTEMPTS", 5)
+
+
+def lease():
+    return timedelta(seconds=getattr(settings, "STORE_OUTBOX_LEASE", 5 * 60))
+
+
+def backoff(attempts):
+    """How long an event that has failed `attempts` times waits before its next try, doubling each time."""
+    return timedelta(seconds=getattr(settings, "STORE_OUTBOX_BACKOFF", 30) * 2 ** (attempts - 1))
+
+
+def claim(batch_size):
+    """
+    Lease up to `batch_size` pending events to the calling worker, oldest first.
+
+    The rows are picked with `SELECT ... FOR UPDATE SKIP LOCKED` and stamped
+    with a lease in one short transaction, so no row lock is held while the
+    handlers run, and other workers skip the batch until the lease runs out.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        events = list(OutboxEvent.objects
+                      .filter(processed_at__isnull=True, attempts__lt=max_attempts())
+                      .filter(Q(leased_until__isnull=True) | Q(leased_until__lte=now))
+                      .order_by("pk").select_for_update(skip_locked=True)[:batch_size])
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(leased_until=now + lease())
+    return events
+
+
+def drain(batch_size=100):
+    """
+    Hand one batch of pending events to their handlers, oldest first.
+
+    Each event runs in its own transaction together with marking it
+    processed, so a failing handler only rolls back its own event. The
+    failure is then recorded outside that transaction and the event is
+    retried after an exponential backoff until it runs out of attempts,
+    instead of burning them all in the batches that follow. A worker dying
+    mid-batch leaves its remaining events to be taken over once their lease
+    expires. Returns the number of events claimed.
+    """
+    events = claim(batch_size)
+    for event in events:
+        try:
+            with transaction.atomic():
+                for handler in HANDLERS[event.topic]:
+                    handler(event.payload)
+                OutboxEvent.objects.filter(pk=event.pk).update(processed_at=Now(), leased_until=None)
+        except Exception as error:
+            logger.exception(f"Outbox event {event} failed")
+            OutboxEvent.objects.filter(pk=event.pk).update(
+                attempts=F("attempts") + 1, last_error=repr(error),
+                leased_until=timezone.now() + backoff(event.attempts + 1))
+    return len(events)
+
+
+@handles(OutboxEvent.STOCK_CHANGED)
+def rebuild_stock_documents(payload):
+    render_product_documents(payload["products"])
+
+
+@handles(OutboxEvent.ORDER_CREATED)
+def notify_order_created(payload):
+    phone_number = User.objects.values_list("phone_number", flat=True).get(pk=payload["user"])
+    CoreUtils().send_notification(
+        phone_number, message=f"Order {payload['order']} placed, total {payload['total']}", kind="notify")
+
+
+@handles(OutboxEvent.PAYMENT_SAVED)
+def notify_payment(payload):
+    phone_number = User.objects.values_list("phone_number", flat=True).get(pk=payload["user"])
+    CoreUtils().send_notification(
+        phone_number, message=f"Payment {payload['transaction_id']} is {payload['status']}", kind="notify")
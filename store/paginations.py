@@ -1,4 +1,9 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.db.models import Q
+
+from rest_framework.pagination import PageNumberPagination, CursorPagination, Cursor
+from rest_framework.exceptions import NotFound
 
 
 class ProductHomePagination(PageNumberPagination):
@@ -6,7 +11,138 @@ class ProductHomePagination(PageNumberPagination):
     page_query_param = 'page'
 
 
-class ReviewPagination(PageNumberPagination):
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (ordering field, id).
+
+    The cursor carries the last seen ``(value, id)`` pair, so each page is a
+    single index range scan with no COUNT query and no OFFSET.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    tiebreaker = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = [field for field in super().get_ordering(request, queryset, view)
+                    if field.lstrip('-') != self.tiebreaker]
+        primary = ordering[0] if ordering else self.ordering[0]
+        direction = '-' if primary.startswith('-') else ''
+        return (primary, direction + self.tiebreaker)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset` for async views, fetching the page through `aiterator`."""
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page([row async for row in page_queryset.aiterator(chunk_size=self.page_size + 1)])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The unevaluated queryset of the requested page plus one row to detect a following page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        ordering = [self._flip(field) for field in self.ordering] if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        if self.cursor and self.cursor.position is not None:
+            queryset = queryset.filter(
+                self._keyset_filter(ordering, self._decode_position(self.cursor.position)))
+
+        return queryset[:self.page_size + 1]
+
+    @property
+    def reverse(self):
+        return self.cursor.reverse if self.cursor else False
+
+    def set_page(self, results):
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = self.cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(value if isinstance(value, (str, int)) else str(value))
+        return json.dumps(values)
+
+    def _decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def _keyset_filter(ordering, values):
+        """Row comparison `(field, id) > (value, pk)` expanded into index friendly lookups."""
+        (field, tiebreaker), (value, pk) = ordering, values
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        field, tiebreaker = field.lstrip('-'), tiebreaker.lstrip('-')
+        return Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"{tiebreaker}__{lookup}": pk})
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+
+class ReviewCursorPagination(ProductCursorPagination):
+    """Newest-first keyset pagination over a product's reviews on (created_at, id)."""
     page_size = 5
     page_size_query_param = 'reviews_per_page'
     max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
+class OrderCursorPagination(ProductCursorPagination):
+    """Newest-first keyset pagination over a user's orders on (created_at, id)."""
+    page_size = 10
+    max_page_size = 50
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
@@ -0,0 +1,98 @@
+from pathlib import Path
+from io import BytesIO
+import logging
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.conf import settings
+
+from PIL import Image, ImageOps
+
+from store.models import ImageRendition
+
+
+logger = logging.getLogger("store")
+
+# Overridden by the STORE_IMAGE_RENDITION_WIDTHS and STORE_IMAGE_RENDITION_FORMATS settings.
+DEFAULT_WIDTHS = {"thumb": 160, "small": 320, "medium": 640, "large": 1280}
+DEFAULT_FORMATS = [ImageRendition.WEBP_FORMAT, ImageRendition.JPEG_FORMAT]
+
+# Image field that feeds the renditions of each model.
+RENDITION_SOURCES = {
+    "store.productimage": "image",
+    "store.revewimage": "image",
+    "store.brand": "logo",
+    "store.product": "thumbnail",
+}
+
+
+def rendition_widths():
+    return getattr(settings, "STORE_IMAGE_RENDITION_WIDTHS", DEFAULT_WIDTHS)
+
+
+def rendition_formats():
+    return getattr(settings, "STORE_IMAGE_RENDITION_FORMATS", DEFAULT_FORMATS)
+
+
+def _encode(image, image_format):
+    """Encode `image` as WebP or JPEG, dropping alpha where the format can't hold it."""
+    if image_format == ImageRendition.JPEG_FORMAT:
+        image = image.convert("RGB")
+        options = {"quality": 82, "optimize": True, "progressive": True}
+    else:
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        options = {"quality": 80, "method": 4}
+
+    buffer = BytesIO()
+    image.save(buffer, format=image_format.upper(), **options)
+    return buffer.getvalue()
+
+
+def generate_renditions(instance, field_name):
+    """
+    Render every configured width and format of `instance.<field_name>` and
+    replace the instance's stored renditions. Renditions already built from
+    the current file are left untouched. Returns the number of files written.
+    """
+    field_file = getattr(instance, field_name)
+    content_type = ContentType.objects.get_for_model(instance)
+    existing = ImageRendition.objects.filter(content_type=content_type, object_id=instance.pk)
+    widths, formats = rendition_widths(), rendition_formats()
+
+    if field_file and existing.filter(source_name=field_file.name).count() == len(widths) * len(formats):
+        return 0
+
+    renditions = []
+    if field_file:
+        stem = Path(field_file.name).stem
+        with field_file.open("rb") as source, Image.open(source) as original:
+            original = ImageOps.exif_transpose(original)
+            for name, width in widths.items():
+                resized = original.copy()
+                # Bound the width only and never upscale.
+                resized.thumbnail((width, resized.height), Image.Resampling.LANCZOS)
+                for image_format in formats:
+                    rendition = ImageRendition(
+                        content_type=content_type, object_id=instance.pk,
+                        source_name=field_file.name, name=name, format=image_format,
+                        width=resized.width, height=resized.height)
+                    rendition.image.save(f"{stem}-{name}.{image_format}",
+                                         ContentFile(_encode(resized, image_format)), save=False)
+                    renditions.append(rendition)
+
+    # The replaced files are removed by the `ImageRendition` post_delete receiver.
+    with transaction.atomic():
+        existing.delete()
+        ImageRendition.objects.bulk_create(renditions)
+
+    logger.info(f"Generated {len(renditions)} renditions for {content_type.model} {instance.pk}")
+    return len(renditions)
+
+
+def schedule_renditions(instance):
+    """Queue rendition generation for `instance` once the transaction commits."""
+    from store.tasks import generate_image_renditions
+
+    label = instance._meta.label_lower
+    transaction.on_commit(lambda: generate_image_renditions.delay(label, instance.pk))
@@ -0,0 +1,86 @@
+from datetime import timedelta
+import logging
+
+from django.utils.translation import gettext_lazy as _
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+from django.db import transaction
+from django.conf import settings
+
+from rest_framework.exceptions import ValidationError
+
+from store.models import OutboxEvent, Product, StockReservation
+
+
+logger = logging.getLogger("store")
+
+
+class InsufficientStock(ValidationError):
+    default_detail = _("Not enough stock left for this product.")
+    default_code = "insufficient_stock"
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, "STORE_RESERVATION_TTL", 15 * 60))
+
+
+def reserve_stock(product_id, quantity, cart, mode="add"):
+    """
+    Hold `quantity` more units of a product for `cart` (exactly `quantity`
+    units with `mode="set"`) until the reservation expires. A cart's hold on
+    a product is one reservation that every change renews. The difference
+    is taken from or returned to stock with a single conditional UPDATE, so
+    concurrent carts can never oversell. Raises `InsufficientStock`.
+    """
+    with transaction.atomic():
+        held = StockReservation.objects.filter(product_id=product_id, cart=cart)
+        current = sum(held.select_for_update().values_list("quantity", flat=True))
+        target = current + quantity if mode == "add" else quantity
+        products = Product.objects.filter(pk=product_id)
+        if target > current and not products.reserve_stock(target - current):
+            raise InsufficientStock({"product": product_id, "quantity": quantity})
+        if target < current:
+            products.release_stock(current - target)
+        held.delete()
+        reservation = None
+        if target:
+            reservation = StockReservation.objects.create(
+                product_id=product_id, cart=cart, quantity=target,
+                expires_at=timezone.now() + reservation_ttl())
+        if target != current:
+            OutboxEvent.publish(OutboxEvent.STOCK_CHANGED, {"products": [product_id]})
+    return reservation
+
+
+def release_reservations(queryset, limit=None):
+    """
+    Return the stock held by the reservations in `queryset` and delete them.
+
+    Rows locked by a concurrent release or checkout are skipped, and the
+    stock of every product is restored with one UPDATE whatever the number
+    of reservations. Returns the number of reservations released.
+    """
+    with transaction.atomic():
+        locked = queryset.order_by("pk").select_for_update(skip_locked=True).values_list("pk", flat=True)
+        ids = list(locked[:limit] if limit else locked)
+        if not ids:
+            return 0
+        reservations = StockReservation.objects.filter(pk__in=ids)
+        held = (reservations.filter(product=OuterRef("pk"))
+                .order_by().values("product").annotate(total=Sum("quantity")).values("total"))
+        product_ids = list(reservations.values_list("product_id", flat=True).distinct())
+        Product.objects.filter(pk__in=product_ids).release_stock(Subquery(held))
+        reservations.delete()
+        OutboxEvent.publish(OutboxEvent.STOCK_CHANGED, {"products": product_ids})
+
+    logger.info(f"Released {len(ids)} stock reservations")
+    return len(ids)
+
+
+def release_expired_reservations(batch_size=1000):
+    """Release every expired reservation in batches, one transaction each."""
+    expired = StockReservation.objects.filter(expires_at__lte=timezone.now())
+    released = 0
+    while batch := release_reservations(expired, limit=batch_size):
+        released += batch
+    return released
@@ -1,8 +1,14 @@
 from graphene_django.types import DjangoObjectType
-from graphene.types import ObjectType, Field, List, Int, String
+from graphene_django.debug import DjangoDebug
+from graphene.types import ObjectType, Field, Int, String
 
 from graphql.error import GraphQLError
 
+from core.connections import KeysetConnectionField
+from core.middlewares import allow_any
+from core.loaders import get_loaders
+
+from store.loaders import ImageProductLoader, ProductCategoryLoader, ProductImagesLoader
 from store.models import Product, Category, ProductImage
 
 
@@ -11,6 +17,9 @@ class ProductImageType(DjangoObjectType):
         model = ProductImage
         fields = ["id", "image", "product"]
 
+    def resolve_product(self, info):
+        return get_loaders(info)[ImageProductLoader].load(self.product_id)
+
 
 class CategoryType(DjangoObjectType):
     class Meta:
@@ -21,26 +30,36 @@ class CategoryType(DjangoObjectType):
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
-        fields = ["id", "title", "unit_price", "stock", "category", "description"]
+        fields = ["id", "title", "unit_price", "stock", "category", "description", "images"]
+
+    def resolve_category(self, info):
+        return get_loaders(info)[ProductCategoryLoader].load(self.category_id)
 
+    def resolve_images(self, info):
+        return get_loaders(info)[ProductImagesLoader].load(self.pk)
 
+
+@allow_any()
 class Query(ObjectType):
-    all_products = List(ProductType, description="Get all products")
+    all_products = KeysetConnectionField(ProductType, description="Get all products")
     product_by_id = Field(ProductType, id=Int(required=True),
                           description="Get product by ID")
 
-    all_categories = List(CategoryType, description="Get all categories")
+    all_categories = KeysetConnectionField(CategoryType, description="Get all categories")
     category_by_id = Field(CategoryType, id=Int(required=True),
                            description="Get category by ID")
 
-    product_images_by_product_id = List(ProductImageType, product_id=Int(required=True),
-                                        description="Get product images by product ID")
+    product_images_by_product_id = KeysetConnectionField(ProductImageType, product_id=Int(required=True),
+                                                         description="Get product images by product ID")
+
+    debug = Field(DjangoDebug, name="_debug",
+                  description="SQL run by this request, when DEBUG enables the debug middleware")
 
     def resolve_all_products(self, info):
         return Product.objects.all()
 
     def resolve_product_by_id(self, info, id):
-        return Product.objects.get(pk=id)
+        return get_loaders(info).collect([Product.objects.get(pk=id)])[0]
 
     def resolve_all_categories(self, info):
         return Category.objects.all()
@@ -0,0 +1,56 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F, Func, FloatField, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Cast, Lower
+
+from store.utility import PERSIAN_SOURCE_CHARS, PERSIAN_TARGET_CHARS, PERSIAN_STRIPPED_CHARS, Utility
+
+
+SEARCH_CONFIG = "simple"
+
+utility = Utility()
+
+
+class PersianNormalize(Func):
+    """SQL twin of `Utility.normalize_persian`, so indexed documents and queries fold the same way."""
+    function = "translate"
+    output_field = TextField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(
+            Lower(expression),
+            Value(PERSIAN_SOURCE_CHARS + PERSIAN_STRIPPED_CHARS),
+            Value(PERSIAN_TARGET_CHARS),
+            **extra)
+
+
+def product_search_vector():
+    """
+    Weighted document for a product row: title (A), category and brands (B),
+    description (C). Related names are pulled with subqueries so the
+    expression can be used in a plain UPDATE.
+    """
+    from store.models import Brand, Category
+
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1])
+    brand_titles = Subquery(
+        Brand.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(titles=StringAgg("title", " "))
+        .values("titles")[:1])
+
+    return (
+        SearchVector(PersianNormalize(F("title")), weight="A", config=SEARCH_CONFIG)
+        + SearchVector(PersianNormalize(category_name), weight="B", config=SEARCH_CONFIG)
+        + SearchVector(PersianNormalize(brand_titles), weight="B", config=SEARCH_CONFIG)
+        + SearchVector(PersianNormalize(F("description")), weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def search_products(queryset, terms):
+    """Filter `queryset` on the search vector and annotate it with a `search_rank`."""
+    query = SearchQuery(utility.normalize_persian(terms),
+                        config=SEARCH_CONFIG, search_type="websearch")
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=Cast(SearchRank(F("search_vector"), query), FloatField()))
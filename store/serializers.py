@@ -1,12 +1,14 @@
 
 from django.db.transaction import atomic
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.contrib.auth import get_user_model
 
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.reverse import reverse
 from rest_framework import serializers
 
-from store.models import Cart, CartItem, Product, ProductImage, Review, UserProfile, Address
-from store.paginations import ReviewPagination
+from store.models import Cart, CartItem, Category, Order, OrderItem, Product, ProductImage, Review, UserProfile, Address
+from store.reservations import reserve_stock
 
 
 User = get_user_model()
@@ -138,6 +140,14 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at']
 
 
+class ReviewSimpleSerializer(serializers.ModelSerializer):
+    user = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = Review
+        fields = ['id', 'user', 'rating', 'comment', 'created_at']
+
+
 class ReviewCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -151,27 +161,59 @@ class ReviewCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class RenditionSrcsetField(serializers.Field):
+    """Map of image format to a `srcset` string, read from prefetched renditions."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, renditions):
+        request = self.context.get("request")
+        srcset = {}
+        for rendition in sorted(renditions.all(), key=lambda rendition: rendition.width):
+            url = rendition.image.url
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            srcset.setdefault(rendition.format, []).append(f"{url} {rendition.width}w")
+        return {image_format: ", ".join(entries) for image_format, entries in srcset.items()}
+
+
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ["id", "name", "slug", "description", "parent", "depth", "product_count"]
+
+
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = RenditionSrcsetField(source="renditions")
+
     class Meta:
         model = ProductImage
-        fields = ["id", "image"]
+        fields = ["id", "image", "srcset"]
 
 
 class ProductSerializer(serializers.ModelSerializer):
+    effective_price = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
     reviews = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ["id", "slug", "title", "description",
-                  "unit_price", "category", "color", "size", "stock", "reviews", "images"]
+        fields = ["id", "slug", "title", "description", "unit_price", "effective_price",
+                  "category", "color", "size", "stock", "reviews", "images"]
 
     def get_reviews(self, obj):
-        reviews = obj.reviews.all()
-        paginator = ReviewPagination()
-        page = paginator.paginate_queryset(reviews, self.context['request'])
-        serializer = ReviewSerializer(page, many=True, context=self.context)
-        return paginator.get_paginated_response(serializer.data).data
+        """Stored rating summary and a link to the paginated review stream."""
+        request = self.context.get('request')
+        url = reverse('product-reviews', kwargs={'slug': obj.slug})
+        return {
+            "average": serializers.DecimalField(
+                max_digits=3, decimal_places=2).to_representation(obj.rating_average),
+            "count": obj.rating_count,
+            "histogram": obj.rating_histogram,
+            "url": request.build_absolute_uri(url) if request else url,
+        }
 
     def get_images(self, obj):
         images = obj.images.all()
@@ -185,68 +227,64 @@ class ProductSimpleSerializer(serializers.ModelSerializer):
         view_name='product-detail',
         lookup_field='slug'
     )
+    effective_price = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
+    rating_histogram = serializers.DictField(
+        child=serializers.IntegerField(), read_only=True)
+    thumbnail_srcset = RenditionSrcsetField(source="renditions")
 
     class Meta:
         model = Product
-        fields = ['title', 'unit_price', 'url', 'thumbnail']
+        fields = ['title', 'unit_price', 'effective_price', 'url', 'thumbnail', 'thumbnail_srcset',
+                  'rating_average', 'rating_count', 'rating_histogram']
 
 
-class CartItemCreateSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = CartItem
-        fields = ["product", "quantity"]
+class CartItemCreateSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    quantity = serializers.IntegerField(min_value=1, default=1)
 
     def create(self, validated_data):
-        print(self.context)
-        cart = self.context['cart']
-        product = validated_data['product']
-        quantity = validated_data['quantity']
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart, product=product)
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-        else:
-            cart_item.quantity = quantity
-            cart_item.save()
-        return cart_item
-
-
-class CartItemSimpleSerializer(serializers.ModelSerializer):
-    product = ProductSimpleSerializer(read_only=True)
+        product, quantity = validated_data['product'], validated_data['quantity']
+        with atomic():
+            reserve_stock(product.pk, quantity, self.context['cart'])
+            return self.context['cart_backend'].add(self.context['cart'], product, quantity)
 
-    class Meta:
-        model = CartItem
-        fields = ["product"]
 
+class CartItemUpdateSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=0)
 
-class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
 
-    class Meta:
-        model = CartItem
-        fields = ["product", "quantity"]
+class CartItemSerializer(serializers.Serializer):
+    """A cart line as stored by the cart backend, `price` being the line total."""
+    product = serializers.IntegerField(read_only=True)
+    quantity = serializers.IntegerField(read_only=True)
+    price = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
 
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True)
+    items = serializers.SerializerMethodField()
+    total_price = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
         fields = [
+            "id",
             "items",
             "label",
             "total_price",
-            "is_paid",
-            "is_shipped",
             "created_at",
             "updated_at"]
 
+    def get_items(self, obj):
+        return CartItemSerializer(self.context['cart_backend'].items(obj), many=True).data
+
+    def get_total_price(self, obj):
+        return serializers.DecimalField(max_digits=20, decimal_places=2).to_representation(
+            self.context['cart_backend'].total(obj))
 
-class CartSimpleSerializer(serializers.ModelSerializer):
+
+class CartSimpleSerializer(CartSerializer):
     url = serializers.HyperlinkedIdentityField(
         view_name="carts-detail", lookup_field="id")
-    items = CartItemSimpleSerializer(many=True)
 
     class Meta:
         model = Cart
@@ -256,7 +294,6 @@ class CartSimpleSerializer(serializers.ModelSerializer):
             "id",
             "label",
             "total_price",
-            "is_shipped",
             "created_at",]
 
 
@@ -267,17 +304,18 @@ class CartCreateSerializer(serializers.ModelSerializer):
         fields = [
             "id",
             "label",
-            "total_price",
-            "is_paid",
-            "is_shipped",
             "created_at",]
+        read_only_fields = ["label"]
 
     def create(self, validated_data):
         user = self.context['request'].user
         if not user.is_authenticated:
             raise PermissionDenied("You must be logged in to create a cart.")
         validated_data["user"] = user
-        return super().create(validated_data)
+        try:
+            return super().create(validated_data)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(error.messages)
 
 
 class CartUpdateSerializer(serializers.ModelSerializer):
@@ -291,3 +329,39 @@ class CartUpdateSerializer(serializers.ModelSerializer):
         if not user.is_authenticated:
             raise PermissionDenied("You must be logged in to update a cart.")
         return super().update(instance, validated_data)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    cart = serializers.PrimaryKeyRelatedField(queryset=Cart.objects.none())
+    shipping_address = serializers.PrimaryKeyRelatedField(queryset=Address.objects.none())
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        user = self.context['request'].user
+        self.fields['cart'].queryset = Cart.objects.select_related("user").filter(
+            user=user, order__isnull=True)
+        self.fields['shipping_address'].queryset = Address.objects.filter(user__user=user)
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = ["product", "quantity", "price"]
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ["id", "order_status", "shipping_address", "order_total_price",
+                  "is_shipped", "is_delivered", "items", "created_at", "updated_at"]
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name="orders-detail")
+
+    class Meta:
+        model = Order
+        fields = ["url", "id", "order_status", "order_total_price",
+                  "is_shipped", "is_delivered", "created_at"]
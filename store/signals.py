@@ -1,26 +1,20 @@
 from django.utils import timezone
-from django.db.transaction import atomic
+from django.db.transaction import atomic, on_commit
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save, pre_save
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 
 
-from store.models import Order, UserProfile, Product, ProductImage
+from store.models import UserProfile, Product, ProductImage, RevewImage, Review, Discount, Category, Brand, ImageRendition
+from store.documents import schedule_product_documents
+from store.renditions import RENDITION_SOURCES, schedule_renditions
+from store.caches import product_cache
 
 
 User = get_user_model()
 
 
-@receiver(post_save, sender=Order)
-def update_order_total_price(sender, instance, **kwargs):
-    """Update order total price after saving the order."""
-    total_price = sum(item.price for item in instance.items.all())
-
-    if instance.order_total_price != total_price:
-        instance.order_total_price = total_price
-        instance.save(update_fields=["order_total_price"])
-
-
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -34,4 +28,234 @@ def update_product_thumbnail(sender, instance, created, **kwargs):
         product = instance.product
         if not product.thumbnail:
             product.thumbnail = instance.image
-            product.save(update_fields=['thumbnail'])
+            product.save(update_fields=['thumbnail', 'updated_at'])
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Keep the stored rating of an edited review so its aggregate contribution can be replaced."""
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = Review.objects.filter(
+            pk=instance.pk).values("product_id", "rating").first()
+
+
+@receiver(post_save, sender=Review)
+def update_product_rating_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_rating", None)
+    if previous:
+        if (previous["product_id"], previous["rating"]) == (instance.product_id, instance.rating):
+            return
+        Product.objects.filter(pk=previous["product_id"]).apply_rating(previous["rating"], -1)
+    Product.objects.filter(pk=instance.product_id).apply_rating(instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def update_product_rating_on_delete(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).apply_rating(instance.rating, -1)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """Drop cached listing pages and the product's detail response, under its previous slug too."""
+    product_cache.invalidate_products({instance.slug, getattr(instance, "_previous_slug", instance.slug)})
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_related_product_cache(sender, instance, **kwargs):
+    """Drop cached responses of the product an image or review belongs to."""
+    product_cache.invalidate_products(
+        Product.objects.filter(pk=instance.product_id).values_list("slug", flat=True))
+
+
+@receiver(m2m_changed, sender=Product.brand.through)
+@receiver(m2m_changed, sender=Product.color.through)
+@receiver(m2m_changed, sender=Product.size.through)
+@receiver(m2m_changed, sender=Discount.product.through)
+def invalidate_m2m_product_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached responses of the products whose brands, colors, sizes or discounts changed."""
+    if not action.startswith("post_"):
+        return
+    if isinstance(instance, Product):
+        product_cache.invalidate_products([instance.slug])
+    elif pk_set:
+        product_cache.invalidate_products(
+            Product.objects.filter(pk__in=pk_set).values_list("slug", flat=True))
+    else:
+        product_cache.invalidate_products()
+
+
+@receiver([post_save, post_delete], sender=Discount)
+def invalidate_discount_cache(sender, instance, **kwargs):
+    """A discount can touch any number of products, so drop the whole catalog."""
+    product_cache.invalidate_products()
+
+
+SEARCHABLE_PRODUCT_FIELDS = {"title", "description", "category"}
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, update_fields=None, **kwargs):
+    """Refresh the product's full-text document when a searchable field changes."""
+    if update_fields and not SEARCHABLE_PRODUCT_FIELDS & set(update_fields):
+        return
+    Product.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(m2m_changed, sender=Product.brand.through)
+def update_brand_search_vector(sender, instance, action, reverse, pk_set, **kwargs):
+    """Brand titles are part of the document, so re-index products whose brands changed."""
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        Product.objects.filter(pk=instance.pk).update_search_vector()
+    elif pk_set:
+        Product.objects.filter(pk__in=pk_set).update_search_vector()
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_vector(sender, instance, created, **kwargs):
+    if not created:
+        Product.objects.filter(category=instance).update_search_vector()
+
+
+@receiver(post_save, sender=Brand)
+def update_brand_title_search_vector(sender, instance, created, **kwargs):
+    if not created:
+        Product.objects.filter(brand=instance).update_search_vector()
+
+
+@receiver(post_save, sender=Product)
+def rebuild_product_document(sender, instance, **kwargs):
+    schedule_product_documents([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Review)
+def rebuild_related_product_document(sender, instance, **kwargs):
+    """Images and the rating summary are part of the detail document."""
+    schedule_product_documents([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.color.through)
+@receiver(m2m_changed, sender=Product.size.through)
+def rebuild_m2m_product_document(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        schedule_product_documents([instance.pk])
+    elif pk_set:
+        schedule_product_documents(pk_set)
+
+
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=RevewImage)
+@receiver(pre_save, sender=Brand)
+def remember_previous_image(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored name of the uploaded image, so renditions are only rebuilt when it changes."""
+    field_name = RENDITION_SOURCES[sender._meta.label_lower]
+    instance._previous_image_name = getattr(instance, field_name).name
+    if instance.pk and (not update_fields or field_name in update_fields):
+        instance._previous_image_name = sender.objects.filter(
+            pk=instance.pk).values_list(field_name, flat=True).first()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=RevewImage)
+@receiver(post_save, sender=Brand)
+def generate_uploaded_image_renditions(sender, instance, created, **kwargs):
+    """Resize new uploads off the request path."""
+    field_file = getattr(instance, RENDITION_SOURCES[sender._meta.label_lower])
+    if field_file and (created or field_file.name != getattr(instance, "_previous_image_name", None)):
+        schedule_renditions(instance)
+
+
+@receiver(post_delete, sender=ImageRendition)
+def delete_rendition_file(sender, instance, **kwargs):
+    """Remove the rendered file along with its row, once the deletion commits."""
+    on_commit(lambda: instance.image.delete(save=False))
+
+
+@receiver(post_save, sender=Product)
+def generate_thumbnail_renditions(sender, instance, update_fields=None, **kwargs):
+    if instance.thumbnail and (not update_fields or "thumbnail" in update_fields):
+        schedule_renditions(instance)
+
+
+@receiver(post_save, sender=Product)
+def recompute_product_discount_price(sender, instance, update_fields=None, **kwargs):
+    if not update_fields or "unit_price" in update_fields:
+        Product.objects.filter(pk=instance.pk).recompute_discount_prices()
+
+
+@receiver(m2m_changed, sender=Discount.product.through)
+def recompute_discounted_prices(sender, instance, action, reverse, pk_set, **kwargs):
+    """Reprice the products attached to or detached from a discount."""
+    if action == "pre_clear" and not reverse:
+        instance._cleared_product_ids = list(instance.product.values_list("pk", flat=True))
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        products = Product.objects.filter(pk=instance.pk)
+    else:
+        products = Product.objects.filter(
+            pk__in=pk_set or getattr(instance, "_cleared_product_ids", []))
+    products.recompute_discount_prices()
+
+
+@receiver(pre_delete, sender=Discount)
+def remember_discounted_products(sender, instance, **kwargs):
+    instance._product_ids = list(instance.product.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Discount)
+def recompute_prices_after_discount_delete(sender, instance, **kwargs):
+    Product.objects.filter(pk__in=instance._product_ids).recompute_discount_prices()
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_category_and_slug(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored category and slug, for the count and cache receivers that run after the save."""
+    instance._previous_category_id = instance.category_id
+    instance._previous_slug = instance.slug
+    fields = set(update_fields) if update_fields else {"category", "slug"}
+    if instance.pk and fields & {"category", "slug"}:
+        previous = Product.objects.filter(pk=instance.pk).values("category_id", "slug").first() or {}
+        if "category" in fields:
+            instance._previous_category_id = previous.get("category_id")
+        if "slug" in fields:
+            instance._previous_slug = previous.get("slug", instance.slug)
+
+
+@receiver(post_save, sender=Product)
+def update_category_product_count_on_save(sender, instance, created, **kwargs):
+    """Move the product between the counts of its old and new category subtrees."""
+    previous = None if created else getattr(instance, "_previous_category_id", instance.category_id)
+    if previous == instance.category_id:
+        return
+    if previous:
+        Category.objects.adjust_product_count(previous, -1)
+    if instance.category_id:
+        Category.objects.adjust_product_count(instance.category_id, 1)
+    product_cache.invalidate_categories()
+
+
+@receiver(post_delete, sender=Product)
+def update_category_product_count_on_delete(sender, instance, **kwargs):
+    if instance.category_id:
+        Category.objects.adjust_product_count(instance.category_id, -1)
+        product_cache.invalidate_categories()
+
+
+@receiver(post_delete, sender=Category)
+def update_ancestor_product_count(sender, instance, **kwargs):
+    """The deleted category's products lose their category, so its ancestors lose them too."""
+    if instance.path and instance.product_count:
+        Category.objects.ancestors(instance.path).exclude(pk=instance.pk).update(
+            product_count=F("product_count") - instance.product_count)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_tree_cache(sender, instance, **kwargs):
+    product_cache.invalidate_categories()
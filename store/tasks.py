@@ -0,0 +1,107 @@
+import logging
+
+from datetime import timedelta
+
+from django.db.models.functions import Now
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from django.db import transaction
+from django.apps import apps
+
+from celery import shared_task
+
+from store.documents import render_product_documents, schedule_product_documents
+from store.renditions import RENDITION_SOURCES, generate_renditions
+from store.reservations import release_expired_reservations
+from store.carts import get_cart_backend
+from store import outbox
+from store.caches import product_cache
+from store.models import Discount, Product
+
+
+logger = logging.getLogger("store")
+
+
+@shared_task
+def rebuild_product_documents(product_ids):
+    """Regenerate the stored detail documents of the given products."""
+    rendered = render_product_documents(product_ids)
+    logger.info(f"Rebuilt {len(rendered)} product documents")
+    return len(rendered)
+
+
+@shared_task
+def generate_image_renditions(label, pk):
+    """Build the resized WebP/JPEG renditions of one uploaded image and refresh what shows them."""
+    instance = apps.get_model(label).objects.filter(pk=pk).first()
+    if instance is None:
+        return 0
+
+    written = generate_renditions(instance, RENDITION_SOURCES[label])
+    if written and label == "store.productimage":
+        schedule_product_documents([instance.product_id])
+    elif written and label == "store.product":
+        Product.objects.filter(pk=pk).update(updated_at=Now())
+        product_cache.invalidate_products([instance.slug])
+    return written
+
+
+DISCOUNT_SCHEDULE_KEY = "store:discounts:last_run"
+
+
+@shared_task
+def apply_discount_schedule(batch_size=1000, full=False):
+    """
+    Reprice products whose discounts started or ended since the previous run,
+    in batches of `batch_size` product ids, each in its own transaction.
+    With `full` every product is repriced.
+    """
+    now = timezone.now()
+    since = cache.get(DISCOUNT_SCHEDULE_KEY) or now - timedelta(days=1)
+
+    products = Product.objects.order_by("pk")
+    if not full:
+        crossed = Discount.objects.filter(
+            Q(start_date__gt=since, start_date__lte=now) | Q(end_date__gte=since, end_date__lt=now))
+        products = products.filter(discount__in=crossed).distinct()
+
+    product_ids = list(products.values_list("pk", flat=True))
+    changed = 0
+    for start in range(0, len(product_ids), batch_size):
+        with transaction.atomic():
+            changed += Product.objects.filter(
+                pk__in=product_ids[start:start + batch_size]).recompute_discount_prices(now=now)
+
+    cache.set(DISCOUNT_SCHEDULE_KEY, now, timeout=None)
+    if changed:
+        product_cache.invalidate_products()
+    logger.info(f"Discount schedule repriced {changed} of {len(product_ids)} products")
+    return changed
+
+
+@shared_task
+def release_expired_stock_reservations(batch_size=1000):
+    """Put the stock of abandoned checkouts back on sale."""
+    return release_expired_reservations(batch_size=batch_size)
+
+
+@shared_task
+def persist_carts(batch_size=500):
+    """Write back the carts changed in the cart backend since the previous run."""
+    written = get_cart_backend().persist_pending(batch_size=batch_size)
+    if written:
+        logger.info(f"Persisted {written} carts")
+    return written
+
+
+@shared_task
+def drain_outbox(batch_size=100, max_batches=50):
+    """Dispatch committed outbox events in batches; several workers can run this at once."""
+    dispatched = 0
+    for _ in range(max_batches):
+        claimed = outbox.drain(batch_size=batch_size)
+        dispatched += claimed
+        if claimed < batch_size:
+            break
+    return dispatched
@@ -1,4 +1,63 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
 
+from store.graphql import schema
+from store.models import Category, OutboxEvent, Product, ProductImage
+from store.tasks import drain_outbox
+from store import outbox
+
+
+class ProductGraphQLQueryCountTests(TestCase):
+    QUERY = """
+    {
+      allProducts {
+        edges { node { title category { name } images { id product { title } } } }
+      }
+    }
+    """
+
+    def create_products(self, count):
+        categories = [Category.objects.create(name=f"category {index}") for index in range(3)]
+        products = Product.objects.bulk_create([
+            Product(title=f"product {index}", slug=f"product-{index}", description="description",
+                    unit_price=index + 1, stock=1, category=categories[index % 3])
+            for index in range(count)
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f"products/{product.slug}-{index}.jpg", alt_text=product.title)
+            for product in products for index in range(2)
+        ])
+
+    def execute(self):
+        result = schema.execute(self.QUERY, context_value=RequestFactory().post("/store/graphql/"))
+        self.assertIsNone(result.errors)
+        return result.data["allProducts"]["edges"]
+
+    def test_nested_relations_are_batched(self):
+        # The page, its categories, its images and the images' products.
+        self.create_products(3)
+        with self.assertNumQueries(4):
+            edges = self.execute()
+        self.assertEqual(len(edges), 3)
+        self.assertEqual(edges[0]["node"]["images"][0]["product"]["title"], edges[0]["node"]["title"])
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.create_products(30)
+        with self.assertNumQueries(4):
+            edges = self.execute()
+        self.assertEqual(len(edges), 30)
+
+
+class OutboxRetryTests(TestCase):
+    def test_failing_handler_is_not_retried_within_the_same_drain(self):
+        handler = mock.Mock(side_effect=RuntimeError("down"))
+        event = OutboxEvent.publish(OutboxEvent.ORDER_CREATED, {"order": 1})
+        with mock.patch.dict(outbox.HANDLERS, {OutboxEvent.ORDER_CREATED: [handler]}):
+            drain_outbox(batch_size=1, max_batches=5)
+        handler.assert_called_once_with({"order": 1})
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertIsNone(event.processed_at)
+        self.assertGreater(event.leased_until, timezone.now())
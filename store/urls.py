@@ -1,12 +1,13 @@
 from django.urls import path
 
-from graphene_django.views import GraphQLView
+from django.conf import settings
 
-from store.graphql import schema
+from store.graphql import StoreGraphQLView, schema
+from store import async_views
 
 from rest_framework.routers import DefaultRouter
 
-from store.views import AddressViewSet, CartItemViewSet, CartViewSet, ProductViewSet, ReviewViewSet, UserProfileViewSet
+from store.views import AddressViewSet, CartItemViewSet, CartViewSet, CategoryViewSet, CheckoutViewSet, OrderViewSet, ProductViewSet, ReviewViewSet, UserProfileViewSet
 
 
 user_profile_router = DefaultRouter()
@@ -15,10 +16,14 @@ user_profile_router.register(r"profile", UserProfileViewSet, basename="user")
 
 user_profile_router.register(r"address", AddressViewSet, basename="address")
 
-# user_profile_router.register(r"carts", CartViewSet, basename="carts")
+user_profile_router.register(r"carts", CartViewSet, basename="carts")
 
-# user_profile_router.register(
-#     r"cart-items", CartItemViewSet, basename="cart-items")
+user_profile_router.register(
+    r"cart-items", CartItemViewSet, basename="cart-items")
+
+user_profile_router.register(r"checkout", CheckoutViewSet, basename="checkout")
+
+user_profile_router.register(r"orders", OrderViewSet, basename="orders")
 
 product_router = DefaultRouter()
 
@@ -28,8 +33,14 @@ product_router.register(
 product_router.register(
     r"review", ReviewViewSet, basename="review")
 
+product_router.register(
+    r"category", CategoryViewSet, basename="category")
+
 urlpatterns = [
-    path('graphql/', GraphQLView.as_view(graphiql=True, schema=schema)),
+    path('graphql/', StoreGraphQLView.as_view(graphiql=settings.DEBUG, schema=schema)),
+    path('async/product/', async_views.product_list, name="async-product-list"),
+    path('async/product/facets/', async_views.product_facets, name="async-product-facets"),
+    path('async/product/<str:slug>/', async_views.product_detail, name="async-product-detail"),
 ]
 
 urlpatterns += user_profile_router.urls + product_router.urls
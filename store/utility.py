@@ -2,9 +2,23 @@ import re
 from django.utils.functional import keep_lazy_text
 
 
+# Arabic code points that Persian keyboards and copy-pasted text mix in,
+# mapped to the canonical Persian letter, plus digits folded to ASCII.
+PERSIAN_SOURCE_CHARS = "\u064a\u0649\u0643\u06c0\u0629" + \
+    "\u0660\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668\u0669" + \
+    "\u06f0\u06f1\u06f2\u06f3\u06f4\u06f5\u06f6\u06f7\u06f8\u06f9" + \
+    "\u200c"
+PERSIAN_TARGET_CHARS = "\u06cc\u06cc\u06a9\u0647\u0647" + \
+    "0123456789" + "0123456789" + " "
+# Diacritics (harakat), superscript alef and tatweel carry no search meaning.
+PERSIAN_STRIPPED_CHARS = "".join(chr(code) for code in range(0x064B, 0x0653)) + "\u0670\u0640"
+
+
 class Utility:
     def __init__(self, prefix="prd"):
         self.prefix = prefix
+        self.persian_table = str.maketrans(
+            PERSIAN_SOURCE_CHARS, PERSIAN_TARGET_CHARS, PERSIAN_STRIPPED_CHARS)
 
     @keep_lazy_text
     def persian_slugify(self, prefix: str, title: str):
@@ -12,3 +26,7 @@ class Utility:
         product_slug = prefix if prefix else self.prefix + "-"
         product_slug += product_name
         return product_slug
+
+    def normalize_persian(self, text: str):
+        """Fold Arabic letter variants, digits and diacritics so Persian text compares consistently."""
+        return re.sub(r'\s+', ' ', text.translate(self.persian_table)).strip().lower()
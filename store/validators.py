@@ -3,3 +3,4 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 
 PRODUCT_PRICE_VALIDATORS = [MinValueValidator(0), MaxValueValidator(1000000)]
 STOCK_QUANTITY_VALIDATORS = [MinValueValidator(0), MaxValueValidator(10000)]
+REVIEW_RATING_VALIDATORS = [MinValueValidator(1), MaxValueValidator(5)]
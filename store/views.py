@@ -1,22 +1,37 @@
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.functional import cached_property
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
+from asgiref.sync import sync_to_async
 
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.filters import OrderingFilter
-from rest_framework.viewsets import ModelViewSet
+
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.viewsets import GenericViewSet, ModelViewSet, ReadOnlyModelViewSet
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 
 from django_filters.rest_framework import DjangoFilterBackend
 
 from store.serializers import (AddressSerializer, AddressCreateSerializer, AddressSimpleSerializer, AddressUpdateSerializer,
-                               CartCreateSerializer, CartItemCreateSerializer, CartItemSerializer, CartItemSimpleSerializer, CartSerializer, CartSimpleSerializer, CartUpdateSerializer,
-                               ProductSerializer, ProductSimpleSerializer, ReviewCreateSerializer, ReviewSerializer, UserProfileSerializer, UserProfileUpdateSerializer)
-from store.models import Product, Review, UserProfile, Address, Cart, CartItem
-from store.paginations import ProductHomePagination
+                               CartCreateSerializer, CartItemCreateSerializer, CartItemSerializer, CartItemUpdateSerializer, CartSerializer, CartSimpleSerializer, CartUpdateSerializer, CategorySerializer, CheckoutSerializer, OrderSerializer, OrderSummarySerializer,
+                               ProductSerializer, ProductSimpleSerializer, ReviewCreateSerializer, ReviewSerializer, ReviewSimpleSerializer, UserProfileSerializer, UserProfileUpdateSerializer)
+from store.models import Category, Order, Product, ProductDocument, Review, UserProfile, Address, Cart, CartItem
+from store.paginations import OrderCursorPagination, ProductCursorPagination, ReviewCursorPagination
 from store.permissions import IsOwnProfile
-from store.filters import ProductFilter
+from store.filters import ProductFilter, ProductOrderingFilter, ProductSearchFilter
+from store.caches import product_cache
+from store.documents import render_product_documents
+from store.facets import ProductFacets
+from store.categories import category_tree
+from store.carts import get_cart_backend
+from store.checkout import checkout
+from store.reservations import release_reservations, reserve_stock
+from store.exports import CSVRenderer, NDJSONRenderer, export_rows
 
 
 User = get_user_model()
@@ -66,17 +81,25 @@ class AddressViewSet(ModelViewSet):
 class ProductViewSet(ModelViewSet):
     http_method_names = ["get"]
     
-    pagination_class = ProductHomePagination
+    pagination_class = ProductCursorPagination
     
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_class = ProductFilter
-    ordering_fields = ['unit_price', 'title', 'created_at']
+    ordering_fields = ['unit_price', 'effective_price', 'title', 'created_at', 'rating_average']
     
     queryset = Product.objects.select_related(
-        "category").prefetch_related("color", "size").all()
+        "category").prefetch_related("color", "size", "renditions").all()
     
     lookup_field = 'slug'
 
+    @property
+    def ordering(self):
+        """Rank search results by relevance unless the client asks for another ordering."""
+        request = getattr(self, "request", None)
+        if request is not None and ProductSearchFilter().get_search_terms(request):
+            return ["-search_rank"]
+        return None
+
     def get_serializer_class(self):
         if self.action == "retrieve":
             return ProductSerializer
@@ -89,6 +112,128 @@ class ProductViewSet(ModelViewSet):
         self.check_object_permissions(self.request, obj)
         return obj
 
+    def get_cache_params(self):
+        """Query parameters that can change the response body, used to normalize cache keys."""
+        if self.action == "retrieve":
+            return set()
+        if self.action == "reviews":
+            pagination = ReviewCursorPagination
+            return {pagination.cursor_query_param, pagination.page_size_query_param}
+        pagination = self.pagination_class
+        return {*self.filterset_class.base_filters, ProductSearchFilter.search_param,
+                ProductOrderingFilter.ordering_param, pagination.cursor_query_param,
+                pagination.page_size_query_param}
+
+    def watermark(self, queryset):
+        """Cheap change marker of a product set: its latest `updated_at` and its size."""
+        marks = queryset.order_by().aggregate(
+            last_modified=Max("updated_at"), count=Count("pk", distinct=True))
+        return marks["last_modified"], marks["count"]
+
+    async def awatermark(self, queryset):
+        marks = await queryset.order_by().aaggregate(
+            last_modified=Max("updated_at"), count=Count("pk", distinct=True))
+        return marks["last_modified"], marks["count"]
+
+    def list(self, request, *args, **kwargs):
+        return product_cache.respond(
+            product_cache.PRODUCT_LIST, request,
+            lambda: super(ProductViewSet, self).list(request, *args, **kwargs).data,
+            lambda: self.watermark(self.filter_queryset(self.get_queryset())),
+            params=self.get_cache_params())
+
+    def get_document(self, slug):
+        """Stored detail document of the product, rendered on the spot if it was never built."""
+        document = ProductDocument.objects.filter(
+            slug=slug).values("updated_at", "body").first()
+        if document is None:
+            product = self.get_object()
+            render_product_documents([product.pk])
+            document = ProductDocument.objects.filter(
+                pk=product.pk).values("updated_at", "body").first()
+        return document
+
+    async def aget_document(self, slug):
+        """`get_document` through the async ORM; rendering a missing document stays synchronous."""
+        document = await ProductDocument.objects.filter(
+            slug=slug).values("updated_at", "body").afirst()
+        if document is None:
+            product_id = await Product.objects.filter(slug=slug).values_list("pk", flat=True).afirst()
+            if product_id is None:
+                raise Http404(f"No {Product._meta.object_name} matches the given query.")
+            await sync_to_async(render_product_documents)([product_id])
+            document = await ProductDocument.objects.filter(
+                pk=product_id).values("updated_at", "body").afirst()
+        return document
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Serve the stored detail document. The document is rebuilt on every
+        product, image, review, color or size change, so its own timestamp is
+        the validator for exactly the bytes being sent.
+        """
+        slug = self.kwargs.get(self.lookup_field)
+        document = {}
+
+        def watermark():
+            document.update(self.get_document(slug))
+            return (document["updated_at"],)
+
+        return product_cache.respond(
+            product_cache.product_detail(slug), request,
+            lambda: document["body"], watermark,
+            params=self.get_cache_params(),
+            response_class=lambda body: HttpResponse(body, content_type="application/json"))
+
+    @action(methods=["get"], detail=True, url_path="reviews")
+    def reviews(self, request, slug=None):
+        """Newest-first review stream of a product, keyset-paginated on (created_at, id)"""
+        product = get_object_or_404(Product.objects.only("pk"), slug=slug)
+        queryset = Review.objects.select_related("user").filter(product=product)
+
+        def render():
+            paginator = ReviewCursorPagination()
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            serializer = ReviewSimpleSerializer(page, many=True, context=self.get_serializer_context())
+            return paginator.get_paginated_response(serializer.data).data
+
+        return product_cache.respond(
+            product_cache.product_detail(slug), request, render,
+            lambda: self.watermark(queryset),
+            params=self.get_cache_params())
+
+    @action(methods=["get"], detail=False, url_path="facets")
+    def facets(self, request):
+        """Category, brand, color and size counts plus a price histogram for the current filters"""
+        queryset = ProductSearchFilter().filter_queryset(request, Product.objects.all(), self)
+        return product_cache.respond(
+            product_cache.PRODUCT_LIST, request,
+            lambda: ProductFacets(queryset, request, self.filterset_class).compute(),
+            lambda: self.watermark(queryset),
+            params=self.get_cache_params())
+
+    @action(detail=False, url_path="export", permission_classes=[IsAuthenticated],
+            renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """The whole filtered catalog as NDJSON (default) or CSV, streamed row by row"""
+        queryset = self.filter_queryset(Product.objects.all())
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(export_rows(queryset)),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}")
+        response.headers["Content-Disposition"] = f'attachment; filename="catalog.{renderer.format}"'
+        return response
+
+
+class CategoryViewSet(ReadOnlyModelViewSet):
+    # Looked up by pk: slugs come from the name alone, so siblings of different parents can share one.
+    queryset = Category.objects.order_by("path")
+    serializer_class = CategorySerializer
+
+    def list(self, request, *args, **kwargs):
+        """The whole category tree with subtree product counts, for navigation menus"""
+        return Response(category_tree())
+
 
 class ReviewViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
@@ -104,15 +249,20 @@ class ReviewViewSet(ModelViewSet):
 
 
 class CartViewSet(ModelViewSet):
+    http_method_names = ["get", "post", "delete"]
     permission_classes = [IsAuthenticated, IsOwnProfile]
     lookup_field = "id"
 
     def get_queryset(self):
         user = self.request.user
-        return Cart.objects.select_related("user").prefetch_related("items").all()
+        return Cart.objects.select_related("user").filter(user=user)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["cart_backend"] = get_cart_backend()
+        return context
 
     def get_serializer_class(self):
-        print(self.action)
         if self.action == "create":
             return CartCreateSerializer
         elif self.action in ("update", "partial_update"):
@@ -121,22 +271,124 @@ class CartViewSet(ModelViewSet):
             return CartSerializer
         return CartSimpleSerializer
 
+    def perform_destroy(self, instance):
+        release_reservations(instance.reservations.all())
+        get_cart_backend().clear(instance)
+        instance.delete()
 
-class CartItemViewSet(ModelViewSet):
-    permission_classes = [IsAuthenticated, IsOwnProfile]
-    lookup_field = "id"
 
-    def get_queryset(self):
-        user = self.request.user
-        cart = Cart.objects.prefetch_related(
-            "items").select_related("user").filter(user=user).first()
-        return CartItem.objects.prefetch_related("user").select_related("cart", "product").filter(cart=cart).all()
+class CartItemViewSet(GenericViewSet):
+    """Lines of the user's cart (`?cart=<id>`, the primary cart by default), addressed by product id."""
+    permission_classes = [IsAuthenticated]
+    lookup_field = "product"
+    lookup_value_regex = r"\d+"
 
     def get_serializer_class(self):
         if self.action == "create":
             return CartItemCreateSerializer
         elif self.action in ("update", "partial_update"):
             return CartItemUpdateSerializer
-        elif self.action == "retrieve":
-            return CartItemSerializer
-        return CartItemSimpleSerializer
+        return CartItemSerializer
+
+    @cached_property
+    def backend(self):
+        return get_cart_backend()
+
+    @cached_property
+    def cart(self):
+        """The addressed cart. The primary cart is created on the first write; reads without one get None."""
+        carts = Cart.objects.filter(user=self.request.user)
+        cart_id = self.request.query_params.get("cart")
+        if cart_id is not None:
+            if not cart_id.isdigit():
+                raise NotFound()
+            return get_object_or_404(carts, pk=cart_id)
+        cart = carts.filter(order__isnull=True).order_by("created_at").first()
+        if cart is None and self.request.method not in SAFE_METHODS:
+            cart = Cart.objects.create(user=self.request.user)
+        return cart
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update(cart=self.cart, cart_backend=self.backend)
+        return context
+
+    def get_line(self):
+        if self.cart is None:
+            raise NotFound()
+        product_id = int(self.kwargs[self.lookup_field])
+        for line in self.backend.items(self.cart):
+            if line["product"] == product_id:
+                return line
+        raise NotFound()
+
+    def list(self, request, *args, **kwargs):
+        cart = self.cart
+        return Response({
+            "cart": cart and cart.pk,
+            "items": CartItemSerializer(self.backend.items(cart) if cart else [], many=True).data,
+            "total_price": serializers.DecimalField(
+                max_digits=20, decimal_places=2).to_representation(self.backend.total(cart) if cart else 0),
+        })
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        line = serializer.save()
+        return Response(CartItemSerializer(line).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(CartItemSerializer(self.get_line()).data)
+
+    def update(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = get_object_or_404(Product, pk=self.kwargs[self.lookup_field])
+        quantity = serializer.validated_data["quantity"]
+        with transaction.atomic():
+            reserve_stock(product.pk, quantity, self.cart, mode="set")
+            line = self.backend.update(self.cart, product, quantity)
+        if line is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(CartItemSerializer(line).data)
+
+    def partial_update(self, request, *args, **kwargs):
+        return self.update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        product_id = int(self.kwargs[self.lookup_field])
+        with transaction.atomic():
+            release_reservations(self.cart.reservations.filter(product_id=product_id))
+            self.backend.remove(self.cart, product_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CheckoutViewSet(GenericViewSet):
+    """Turn one of the user's carts into an order."""
+    permission_classes = [IsAuthenticated]
+    serializer_class = CheckoutSerializer
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = checkout(serializer.validated_data["cart"],
+                         serializer.validated_data["shipping_address"], get_cart_backend())
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class OrderViewSet(ReadOnlyModelViewSet):
+    """The user's order history, newest first."""
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
+
+    def get_queryset(self):
+        orders = Order.objects.filter(user=self.request.user)
+        if self.action == "retrieve":
+            return orders.prefetch_related("items")
+        return orders.only("id", "order_status", "order_total_price",
+                           "is_shipped", "is_delivered", "created_at")
+
+    def get_serializer_class(self):
+        if self.action == "retrieve":
+            return OrderSerializer
+        return OrderSummarySerializer